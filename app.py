@@ -2,17 +2,41 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
-from logging import Formatter, FileHandler
-
 import babel
+import click
 import dateutil.parser
-import logging
-from flask import Flask, render_template, request, flash, redirect, url_for, abort
+import math
+import sys
+from datetime import datetime, timedelta
+from flask import Flask, render_template, request, flash, redirect, url_for, abort, jsonify, Response, \
+    stream_with_context, stream_template, get_flashed_messages
 from flask_migrate import Migrate
 from flask_moment import Moment
-from sqlalchemy import func
+from werkzeug.exceptions import HTTPException
 from forms import *
+import calendar_feed
+import dedupe
+import deletes
+import directory
+import edits
+import geo
+import listings
+import logs
+import metrics
+import ratelimit
+from compress import CompressionMiddleware
+from calendar_feed import get_feed, invalidate_feed, feed_cache
+from export import EXPORT_FORMATS, export_shows
+import readers
+import recommendations
+import rollups
+import search
+import tasks
+from readers import to_genres_list
 from models import Venue, Show, Artist, db
+import prefix_index
+from prefix_index import PrefixIndex
+from profiling import ProfilingMiddleware, make_token
 
 # ----------------------------------------------------------------------------#
 # App Config.
@@ -24,6 +48,28 @@ app.config.from_object('config')
 
 db.init_app(app)
 migrate = Migrate(app, db)
+metrics.init_app(app, db)
+metrics.register_cache('calendar_feed', feed_cache)
+metrics.register_cache('search', search.search_cache)
+metrics.register_cache('shows', listings.shows_cache)
+ratelimit.init_app(app)
+tasks.init_app(app)
+
+if app.config['COMPRESS_ENABLED']:
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_bytes=app.config['COMPRESS_MIN_BYTES'])
+
+if app.config['PROFILE_ENABLED']:
+    app.wsgi_app = ProfilingMiddleware(
+        app.wsgi_app, app.url_map, app.config['PROFILE_DIR'],
+        sample_rate=app.config['PROFILE_SAMPLE_RATE'],
+        secret=app.config['PROFILE_SECRET'],
+        max_files_per_route=app.config['PROFILE_MAX_FILES_PER_ROUTE'],
+        max_bytes=app.config['PROFILE_MAX_BYTES']
+    )
+
+# Typeahead indexes over artist and venue names, built on first lookup
+artist_index = PrefixIndex(lambda: Artist.query.with_entities(Artist.id, Artist.name).yield_per(10000))
+venue_index = PrefixIndex(lambda: Venue.query.with_entities(Venue.id, Venue.name).yield_per(10000))
 
 
 # ----------------------------------------------------------------------------#
@@ -49,9 +95,26 @@ app.jinja_env.filters['datetime'] = format_datetime
 # ----------------------------------------------------------------------------#
 # Helper functions.
 # ----------------------------------------------------------------------------#
-# Transform comma-delimited string of genres to list
-def to_genres_list(genres):
-    return genres.split(",")
+
+def duplicate_message(kind, name, duplicates):
+    links = ', '.join('"%s" (/%ss/%d)' % (dup_name, kind, dup_id) for dup_id, dup_name, _ in duplicates[:3])
+    return '%s %s looks like a duplicate of %s.' % (kind.capitalize(), name, links)
+
+
+# Listing pages are sent while they render, so the first bytes (and the
+# compressor) get going before the last row is formatted
+def stream_page(template_name, **context):
+    # read the flashes now; a streamed body renders after the session cookie is saved
+    get_flashed_messages()
+    return Response(stream_template(template_name, **context))
+
+
+# Search pages are plain GETs, so let browsers and proxies keep them briefly
+def search_response(body):
+    response = app.make_response(body)
+    response.cache_control.public = True
+    response.cache_control.max_age = search.SEARCH_CACHE_TTL
+    return response
 
 
 # ----------------------------------------------------------------------------#
@@ -70,61 +133,26 @@ def index():
 def venues():
     areas_list = []
     try:
-
-        venues_list = db.session.execute(f"""
-            SELECT "Venue".id AS "id", "Venue".name AS name, "Venue".city AS city,
-            "Venue".state AS state, count("Show".id) AS num_upcoming_shows FROM "Venue"
-            LEFT JOIN "Show" ON "Venue".id = "Show".venue_id
-            AND "Show".start_time > now() 
-            GROUP BY "Venue".id
-        """) \
-            .mappings() \
-            .all()
-
-        query = Venue.query \
-            .with_entities(Venue.city.label('city'), Venue.state.label('state')) \
-            .group_by(Venue.state, Venue.city) \
-            .all()
-
-        areas_list = list(map(lambda q: q._asdict(), query))
-        for a in areas_list:
-            a['venues'] = []
-            for v in venues_list:
-                if a['city'] == v['city']:
-                    a['venues'].append(v)
+        areas_list = readers.venues_by_area()
     except Exception as err:
         flash('An error occurred!')
     finally:
         db.session.close()
-    return render_template('pages/venues.html', areas=areas_list)
+    return stream_page('pages/venues.html', areas=areas_list)
 
 
-@app.route('/venues/search', methods=['POST'])
+@app.route('/venues/search', methods=['GET', 'POST'])
+@ratelimit.limit(app.config['SEARCH_RATE_LIMIT'], app.config['SEARCH_RATE_BURST'], expensive=True)
 def search_venues():
     # implement search on artists with partial string search. Ensure it is case-insensitive.
-    # search for Hop should return "The Musical Hop".
-    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-    search_term = request.form['search_term']
+    # POSTs from older pages are redirected to the cacheable GET form
+    if request.method == 'POST':
+        return redirect(url_for('search_venues', search_term=request.form.get('search_term', '')), 303)
+    search_term = request.args.get('search_term', '')
     error = False
     response = {}
     try:
-        # search for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-        # search for "band" should return "The Wild Sax Band".
-        data = db.session.execute("""
-                 SELECT  "Venue".id, "Venue".name, COUNT("Show".id) as num_upcoming_shows
-                 FROM "Venue" 
-                 LEFT OUTER JOIN "Show" ON "Venue".id = "Show".venue_id
-                 AND "Show".start_time > now() 
-                 WHERE "Venue".name ILIKE :val
-                 GROUP BY "Venue".id
-
-                """, {'val': '%' + search_term + '%'}) \
-            .mappings() \
-            .all()
-        response = {
-            "count": len(data),
-            "data": data
-        }
+        response = search.search_venues(search_term, request.args.get('page', 1, type=int))
     except Exception as err:
         error = True
     finally:
@@ -132,43 +160,51 @@ def search_venues():
         if error:
             flash('An error occurred!')
             abort(500)
-    return render_template('pages/search_venues.html', results=response,
-                           search_term=request.form.get('search_term', ''))
+    return search_response(render_template('pages/search_venues.html', results=response,
+                                           search_term=search_term))
+
+
+@app.route('/venues/nearby')
+def nearby_venues():
+    # ?lat=&lng= or ?city=&state=, plus an optional radius in miles
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lng', type=float)
+    if latitude is None or longitude is None:
+        point = geo.geocode(request.args.get('city'), request.args.get('state'))
+        if point is None:
+            return jsonify(error='Pass lat and lng, or a known city and state.'), 400
+        latitude, longitude = point
+    # float() accepts 'nan' and 'inf', and NaN slips through every comparison
+    if not (math.isfinite(latitude) and math.isfinite(longitude)
+            and -90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return jsonify(error='lat or lng out of range.'), 400
+    radius = request.args.get('radius', 20, type=float)
+    if not math.isfinite(radius):
+        return jsonify(error='radius must be a finite number of miles.'), 400
+    radius = min(max(radius, 0), geo.MAX_RADIUS_MILES)
+    try:
+        results = geo.nearby_venues(latitude, longitude, radius)
+    finally:
+        db.session.close()
+    return jsonify(latitude=latitude, longitude=longitude, radius=radius, count=len(results), data=results)
 
 
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
-    # replace with real venue data from the venues table, using venue_id
     error = False
-    venue = {}
+    venue = None
     try:
-        # shows the artist page with the given artist_id
-        venue = Venue.query.filter_by(id=venue_id).one()
-        venue.genres = to_genres_list(venue.genres)
-
-        past_shows = db.session.query(Show.start_time, Show.artist_id, Show.id, Show.venue_id, Venue.id, Venue.name,
-                                      Venue.image_link, Artist.name.label("artist_name"),
-                                      Artist.image_link.label("artist_image_link")) \
-            .filter(Show.venue_id == venue_id, Show.start_time < func.now()) \
-            .join(Venue, Artist)
-
-        upcoming_shows = db.session.query(Show.start_time, Show.artist_id, Show.id, Show.venue_id, Venue.id, Venue.name,
-                                          Venue.image_link, Artist.name.label("artist_name"),
-                                          Artist.image_link.label("artist_image_link")) \
-            .filter(Show.venue_id == venue_id, Show.start_time > func.now()) \
-            .join(Venue, Artist)
-        venue.website = venue.website_link
-        venue.past_shows = past_shows.all()
-        venue.upcoming_shows = upcoming_shows.all()
-        venue.upcoming_shows_count = upcoming_shows.count()
-        venue.past_shows_count = past_shows.count()
+        venue = readers.get_venue_detail(venue_id)
     except Exception as err:
         error = True
-        flash('An error occurred!')
-        abort(500)
     finally:
         db.session.close()
+        if error:
+            flash('An error occurred!')
+            abort(500)
+    if venue is None:
+        abort(404)
     return render_template('pages/show_venue.html', venue=venue)
 
 
@@ -197,75 +233,122 @@ def create_venue_submission():
             facebook_link=form.facebook_link.data,
             website_link=form.website_link.data,
             seeking_talent=form.seeking_talent.data,
-            seeking_description=form.seeking_description.data
+            seeking_description=form.seeking_description.data,
+            **geo.location_columns(form.city.data, form.state.data),
+            **dedupe.key_columns(form.name.data)
         )
+        duplicates = []
         try:
-            db.session.add(venue)
-            db.session.commit()
+            if app.config['DUPLICATE_MODE'] != 'off':
+                duplicates = dedupe.find_duplicates(Venue, form.name.data, form.city.data, form.state.data)
+            if not (duplicates and app.config['DUPLICATE_MODE'] == 'reject'):
+                db.session.add(venue)
+                db.session.commit()
         except Exception as err:
             error = True
             db.session.rollback()
         finally:
             db.session.close()
+        if duplicates and app.config['DUPLICATE_MODE'] == 'reject':
+            flash(duplicate_message('venue', form.name.data, duplicates))
+            flash(form.name.data + ' was not listed; edit the existing one instead.')
+            return render_template('forms/new_venue.html', form=form)
         if error:
             flash('An error occurred. Venue ' + venue.name + ' could not be listed.')
         else:
+            venue_index.add(venue.id, venue.name)
             flash('Venue ' + request.form['name'] + ' was successfully listed!')
+            if duplicates:
+                flash(duplicate_message('venue', form.name.data, duplicates))
     else:
         flash(form.errors)
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
-def delete_venue(venue_id):
-    # Complete this endpoint for taking a venue_id, and using
-    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+def delete_in_background(kind, entity_id):
+    # task body: the chunked delete, then everything cached about the row
+    name = deletes.run(kind, entity_id)
+    (venue_index if kind == 'venue' else artist_index).remove(entity_id)
+    if kind == 'artist' and name is not None:
+        directory.letter_counts.remove(name)
+    # the shows went from the feeds, listings and search counts of the other side too
+    feed_cache.clear()
+    listings.shows_cache.clear()
+    search.search_cache.clear()
+
 
-    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-    # clicking that button delete it from the db then redirect the user to the homepage
+def start_delete(kind, entity_id):
+    # DELETE handler for venues and artists: 202 with a status URL to poll
+    exists = False
+    status = None
     try:
-        Venue.query.filter_by(id=venue_id).delete()
-        db.session.commit()
-        flash('Venue deleted successfully!')
-    except Exception as err:
-        db.session.rollback()
-        flash(str(err))
-        flash('Venue deletion failed!')
+        model = Venue if kind == 'venue' else Artist
+        exists = db.session.execute(db.select(model.id).where(model.id == entity_id)).first() is not None
+        if exists:
+            status = deletes.start(kind, entity_id)
     finally:
         db.session.close()
-    return render_template('pages/home.html')
+    if not exists:
+        abort(404)
+    status_url = url_for(kind + '_deletion', **{kind + '_id': entity_id})
+    if status is not None:
+        tasks.enqueue(delete_in_background, kind, entity_id)
+    # status is None when a delete is already in progress; report on that one
+    body = dict(deletes.status(kind, entity_id) or {}, status_url=status_url)
+    return jsonify(body), 202, {'Location': status_url}
+
+
+def deletion_status(kind, entity_id):
+    status = deletes.status(kind, entity_id)
+    if status is None:
+        abort(404)
+    return jsonify(status)
+
+
+@app.route('/venues/<int:venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+    # shows go in batches on a background worker; see deletes.py
+    return start_delete('venue', venue_id)
+
+
+@app.route('/venues/<int:venue_id>/deletion')
+def venue_deletion(venue_id):
+    return deletion_status('venue', venue_id)
 
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-    data = Artist.query.with_entities(Artist.id, Artist.name).all()
-    return render_template('pages/artists.html', artists=data)
+    # one letter of the A-Z directory, paged by (lower(name), id)
+    data = []
+    counts = {}
+    next_cursor = None
+    letter = request.args.get('letter', '').upper()
+    try:
+        counts = directory.letter_counts.get()
+        if letter not in counts:
+            letter = next((l for l in directory.LETTERS if counts[l]), 'A')
+        data, next_cursor = directory.artist_page(letter, request.args.get('after'),
+                                                  request.args.get('after_id', type=int))
+    except Exception as err:
+        flash('An error occurred!')
+    finally:
+        db.session.close()
+    return stream_page('pages/artists.html', artists=data, letter=letter, counts=counts,
+                       next_cursor=next_cursor)
 
 
-@app.route('/artists/search', methods=['POST'])
+@app.route('/artists/search', methods=['GET', 'POST'])
+@ratelimit.limit(app.config['SEARCH_RATE_LIMIT'], app.config['SEARCH_RATE_BURST'], expensive=True)
 def search_artists():
-    search_term = request.form['search_term']
+    if request.method == 'POST':
+        return redirect(url_for('search_artists', search_term=request.form.get('search_term', '')), 303)
+    search_term = request.args.get('search_term', '')
     error = False
     response = {}
     try:
-        # search for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-        # search for "band" should return "The Wild Sax Band".
-        data = db.session.execute("""
-             SELECT  "Artist".id, "Artist".name, COUNT("Show".artist_id) as num_upcoming_shows
-             FROM "Artist" 
-             LEFT OUTER JOIN "Show" ON "Artist".id = "Show".artist_id 
-             WHERE "Artist".name ILIKE :val
-             GROUP BY "Artist".id
-    
-            """, {'val': '%' + search_term + '%'}) \
-            .mappings() \
-            .all()
-        response = {
-            "count": len(data),
-            "data": data
-        }
+        response = search.search_artists(search_term, request.args.get('page', 1, type=int))
     except Exception as err:
         error = True
     finally:
@@ -273,63 +356,53 @@ def search_artists():
         if error:
             flash('An error occurred!')
             abort(500)
-    return render_template('pages/search_artists.html', results=response,
-                           search_term=request.form.get('search_term', ''))
+    return search_response(render_template('pages/search_artists.html', results=response,
+                                           search_term=search_term))
 
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
+    # shows the artist page with the given artist_id
     error = False
-    artist = []
+    artist = None
     try:
-        # shows the artist page with the given artist_id
-        artist = Artist.query.filter_by(id=artist_id).one()
-        artist.genres = to_genres_list(artist.genres)
-
-        past_shows = db.session.query(Show.start_time, Show.artist_id, Show.id, Show.venue_id, Venue.id,
-                                      Venue.name.label("venue_name"),
-                                      Venue.image_link.label("venue_image_link")) \
-            .filter(Show.artist_id == artist_id, Show.start_time < func.now()) \
-            .join(Venue, Artist)
-
-        upcoming_shows = db.session.query(Show.start_time, Show.artist_id, Show.id, Show.venue_id, Venue.id,
-                                          Venue.name.label("venue_name"),
-                                          Venue.image_link.label("venue_image_link")) \
-            .filter(Show.artist_id == artist_id, Show.start_time > func.now()) \
-            .join(Venue, Artist)
-
-        artist.past_shows = past_shows.all()
-        artist.upcoming_shows = upcoming_shows.all()
-        artist.upcoming_shows_count = upcoming_shows.count()
-        artist.past_shows_count = past_shows.count()
+        artist = readers.get_artist_detail(artist_id)
     except Exception as err:
         error = True
-        flash('An error occurred!')
     finally:
         db.session.close()
+        if error:
+            flash('An error occurred!')
+            abort(500)
+    if artist is None:
+        abort(404)
     return render_template('pages/show_artist.html', artist=artist)
 
 
+@app.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+    return start_delete('artist', artist_id)
+
+
+@app.route('/artists/<int:artist_id>/deletion')
+def artist_deletion(artist_id):
+    return deletion_status('artist', artist_id)
+
+
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     form = ArtistForm()
-    artist = {}
+    artist = None
     try:
-        artist = Artist.query.filter_by(id=artist_id).first()
-        form.name.data = artist.name
-        form.genres.data = to_genres_list(artist.genres)
-        form.phone.data = artist.phone
-        form.state.data = artist.state
-        form.city.data = artist.city
-        form.facebook_link.data = artist.facebook_link
-        form.website_link.data = artist.website_link
-        form.image_link.data = artist.image_link
-        form.seeking_venue.data = artist.seeking_venue
-        form.seeking_description.data = artist.seeking_description
+        artist = readers.get_artist(artist_id)
+        if artist is None:
+            abort(404)
+        edits.fill_form(form, artist, edits.ARTIST_FIELDS, to_genres_list)
+    except HTTPException:
+        raise
     except Exception as err:
-        db.session.rollback()
         flash('An error occurred!')
     finally:
         db.session.close()
@@ -342,25 +415,39 @@ def edit_artist_submission(artist_id):
     # artist record with ID <artist_id> using the new attributes
     form = ArtistForm(request.form)
     if form.validate():
+        changes = edits.changed_values(form, edits.ARTIST_FIELDS)
+        if not changes:
+            flash('No changes to save.')
+            return redirect(url_for('show_artist', artist_id=artist_id))
+        if 'name' in changes:
+            changes.update(dedupe.key_columns(changes['name']))
+        outcome = None
         try:
-            artist = Artist.query.filter_by(id=artist_id).first()
-            artist.name = form.name.data
-            artist.city = form.city.data
-            artist.state = form.state.data
-            artist.phone = form.phone.data
-            artist.genres = ', '.join(form.genres.data)
-            artist.image_link = form.image_link.data
-            artist.facebook_link = form.facebook_link.data
-            artist.website_link = form.website_link.data
-            artist.seeking_venue = form.seeking_venue.data
-            artist.seeking_description = form.seeking_description.data
+            # the snapshot has the name the form started from, for the directory counts
+            old_name = edits.original_value(form, 'name')
+            outcome = edits.update_versioned(Artist, artist_id, form.version.data, changes)
             db.session.commit()
-            flash('Artist info edited successfully!')
+            if outcome == edits.SAVED:
+                if 'name' in changes:
+                    artist_index.add(artist_id, changes['name'])
+                    if old_name is None:
+                        directory.letter_counts.clear()
+                    else:
+                        directory.letter_counts.rename(old_name, changes['name'])
+                invalidate_feed('artist', artist_id)
+                listings.shows_cache.clear()
+                flash('Artist info edited successfully!')
         except Exception as err:
             flash('Artist edition failed!')
             db.session.rollback()
         finally:
             db.session.close()
+        if outcome == edits.MISSING:
+            abort(404)
+        if outcome == edits.CONFLICT:
+            flash('This artist was changed by someone else while you were editing. '
+                  'Your changes were not saved; review the current details and try again.')
+            return redirect(url_for('edit_artist', artist_id=artist_id))
     else:
         flash(form.errors)
     return redirect(url_for('show_artist', artist_id=artist_id))
@@ -369,22 +456,15 @@ def edit_artist_submission(artist_id):
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     form = VenueForm()
-    venue = []
+    venue = None
     try:
-        venue = Venue.query.filter_by(id=venue_id).first()
-        form.phone.data = venue.phone
-        form.state.data = venue.state
-        form.city.data = venue.city
-        form.facebook_link.data = venue.facebook_link
-        form.website_link.data = venue.website_link
-        form.name.data = venue.name
-        form.seeking_description.data = venue.seeking_description
-        form.seeking_talent.data = venue.seeking_talent
-        form.image_link.data = venue.image_link
-        form.address.data = venue.address
-        form.genres.data = to_genres_list(venue.genres)
+        venue = readers.get_venue(venue_id)
+        if venue is None:
+            abort(404)
+        edits.fill_form(form, venue, edits.VENUE_FIELDS, to_genres_list)
+    except HTTPException:
+        raise
     except Exception as err:
-        db.session.rollback()
         flash('An error occurred!')
     finally:
         db.session.close()
@@ -397,26 +477,35 @@ def edit_venue_submission(venue_id):
     # venue record with ID <venue_id> using the new attributes
     form = VenueForm(request.form)
     if form.validate():
+        changes = edits.changed_values(form, edits.VENUE_FIELDS)
+        if not changes:
+            flash('No changes to save.')
+            return redirect(url_for('show_venue', venue_id=venue_id))
+        if 'city' in changes or 'state' in changes:
+            changes.update(geo.location_columns(form.city.data, form.state.data))
+        if 'name' in changes:
+            changes.update(dedupe.key_columns(changes['name']))
+        outcome = None
         try:
-            venue = Venue.query.filter_by(id=venue_id).first()
-            venue.name = form.name.data
-            venue.city = form.city.data
-            venue.state = form.state.data
-            venue.phone = form.phone.data
-            venue.genres = ', '.join(form.genres.data)
-            venue.image_link = form.image_link.data
-            venue.facebook_link = form.facebook_link.data
-            venue.website_link = form.website_link.data
-            venue.seeking_talent = form.seeking_talent.data
-            venue.seeking_description = form.seeking_description.data
-            venue.address = form.address.data
+            outcome = edits.update_versioned(Venue, venue_id, form.version.data, changes)
             db.session.commit()
-            flash('Venue info edited successfully!')
+            if outcome == edits.SAVED:
+                if 'name' in changes:
+                    venue_index.add(venue_id, changes['name'])
+                invalidate_feed('venue', venue_id)
+                listings.shows_cache.clear()
+                flash('Venue info edited successfully!')
         except Exception as err:
             flash('Venue edition failed!')
             db.session.rollback()
         finally:
             db.session.close()
+        if outcome == edits.MISSING:
+            abort(404)
+        if outcome == edits.CONFLICT:
+            flash('This venue was changed by someone else while you were editing. '
+                  'Your changes were not saved; review the current details and try again.')
+            return redirect(url_for('edit_venue', venue_id=venue_id))
     else:
         flash(form.errors)
     return redirect(url_for('show_venue', venue_id=venue_id))
@@ -446,20 +535,33 @@ def create_artist_submission():
             facebook_link=form.facebook_link.data,
             website_link=form.website_link.data,
             seeking_venue=form.seeking_venue.data,
-            seeking_description=form.seeking_description.data
+            seeking_description=form.seeking_description.data,
+            **dedupe.key_columns(form.name.data)
         )
+        duplicates = []
         try:
-            db.session.add(artist)
-            db.session.commit()
+            if app.config['DUPLICATE_MODE'] != 'off':
+                duplicates = dedupe.find_duplicates(Artist, form.name.data, form.city.data, form.state.data)
+            if not (duplicates and app.config['DUPLICATE_MODE'] == 'reject'):
+                db.session.add(artist)
+                db.session.commit()
         except Exception as err:
             error = True
             db.session.rollback()
         finally:
             db.session.close()
+        if duplicates and app.config['DUPLICATE_MODE'] == 'reject':
+            flash(duplicate_message('artist', form.name.data, duplicates))
+            flash(form.name.data + ' was not listed; edit the existing one instead.')
+            return render_template('forms/new_artist.html', form=form)
         if error:
             flash('An error occurred. Artist ' + artist.name + ' could not be listed.')
         else:
+            artist_index.add(artist.id, artist.name)
+            directory.letter_counts.add(artist.name)
             flash('Artist ' + request.form['name'] + ' was successfully listed!')
+            if duplicates:
+                flash(duplicate_message('artist', form.name.data, duplicates))
     else:
         flash(form.errors)
     return render_template('pages/home.html')
@@ -468,26 +570,41 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
+def parse_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        flash('Dates must look like 2026-10-31.')
+        return None
+
+
 @app.route('/shows')
 def shows():
-    # displays list of shows at /shows
-    # replace with real venues data.
-    data = []
+    # displays list of shows at /shows, filtered by date range, city and genre
+    preset = request.args.get('range', 'upcoming')
+    if preset not in listings.SHOW_PRESETS:
+        preset = 'upcoming'
+    start, end = listings.preset_range(preset, datetime.now())
+    date_from = parse_day(request.args.get('from'))
+    date_to = parse_day(request.args.get('to'))
+    if date_from or date_to:
+        # explicit dates win over the preset; the to date is inclusive
+        start = date_from
+        end = date_to + timedelta(days=1) if date_to else None
+    city = request.args.get('city', '')
+    genre = request.args.get('genre', '')
+    listing = listings.Listing([], False)
     try:
-        data = db.session.execute(f"""
-            SELECT "Show".id , "Show".venue_id, "Show".artist_id, "Show".start_time, 
-            "Venue".name AS venue_name, "Venue".id AS venue_id, 
-            "Artist".id AS artist_id, "Artist".name AS artist_name, "Artist".image_link AS artist_image_link
-            FROM "Show" 
-            JOIN "Venue" ON "Venue".id = "Show".venue_id 
-            JOIN "Artist" ON "Artist".id = "Show".artist_id
-        """).mappings() \
-            .all()
+        listing = listings.browse_shows(start, end, city, genre)
     except Exception as err:
         flash('An error occurred!')
     finally:
         db.session.close()
-    return render_template('pages/shows.html', shows=data)
+    return stream_page('pages/shows.html', shows=listing.shows, truncated=listing.truncated,
+                       newest_first=start is None, limit=listings.SHOW_LISTING_LIMIT,
+                       presets=listings.SHOW_PRESETS, preset=preset,
+                       date_from=request.args.get('from', ''), date_to=request.args.get('to', ''),
+                       city=city, genre=genre)
 
 
 @app.route('/shows/create')
@@ -508,6 +625,16 @@ def create_show_submission():
             flash('Unknown artist with id ' + form.artist_id.data)
         if venue is None:
             flash('Unknown venue with id ' + form.venue_id.data)
+        if artist is not None and deletes.pending('artist', artist.id):
+            artist = None
+            flash('Artist ' + form.artist_id.data + ' is being deleted')
+        if venue is not None and deletes.pending('venue', venue.id):
+            venue = None
+            flash('Venue ' + form.venue_id.data + ' is being deleted')
+        if artist is None or venue is None:
+            db.session.close()
+            flash('Show could not be listed!')
+            return render_template('pages/home.html')
         show = Show(
             artist_id=form.artist_id.data,
             venue_id=form.venue_id.data,
@@ -515,6 +642,9 @@ def create_show_submission():
         )
         try:
             db.session.add(show)
+            rollups.record_show(venue.id, artist.id, show.start_time)
+            calendar_feed.touch(Venue, [venue.id])
+            calendar_feed.touch(Artist, [artist.id])
             db.session.commit()
         except Exception as err:
             error = True
@@ -525,12 +655,128 @@ def create_show_submission():
         if error:
             flash('Show could not be listed!')
         else:
+            invalidate_feed('artist', artist.id)
+            invalidate_feed('venue', venue.id)
+            listings.invalidate(form.start_time.data, venue.city)
+            tasks.enqueue(recommendations.refresh_for_show, artist.id, venue.id)
             flash('Show for ' + artist.name + ' was successfully listed!')
     else:
         flash(form.errors)
     return render_template('pages/home.html')
 
 
+#  Analytics
+#  ----------------------------------------------------------------
+
+@app.route('/venues/<int:venue_id>/analytics')
+def venue_analytics(venue_id):
+    # booking analytics for venue owners, read from the show rollups only
+    error = False
+    venue = None
+    data = {}
+    try:
+        venue = readers.get_venue(venue_id)
+        if venue is not None:
+            data = rollups.venue_analytics(venue_id)
+    except Exception as err:
+        error = True
+    finally:
+        db.session.close()
+        if error:
+            flash('An error occurred!')
+            abort(500)
+    if venue is None:
+        abort(404)
+    return render_template('pages/venue_analytics.html', venue=venue, analytics=data)
+
+
+@app.route('/venues/<int:venue_id>/analytics.json')
+def venue_analytics_json(venue_id):
+    try:
+        if readers.get_venue(venue_id) is None:
+            abort(404)
+        return jsonify(rollups.venue_analytics(venue_id))
+    finally:
+        db.session.close()
+
+
+@app.route('/artists/<int:artist_id>/analytics.json')
+def artist_analytics_json(artist_id):
+    try:
+        if readers.get_artist(artist_id) is None:
+            abort(404)
+        return jsonify(rollups.artist_analytics(artist_id))
+    finally:
+        db.session.close()
+
+
+#  Calendar feeds
+#  ----------------------------------------------------------------
+
+def calendar_response(kind, entity_id):
+    feed = get_feed(kind, entity_id)
+    if feed is None:
+        abort(404)
+    response = Response(feed.body, mimetype='text/calendar')
+    response.set_etag(feed.etag)
+    response.last_modified = feed.last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(request)
+
+
+@app.route('/venues/<int:venue_id>/calendar.ics')
+def venue_calendar(venue_id):
+    return calendar_response('venue', venue_id)
+
+
+@app.route('/artists/<int:artist_id>/calendar.ics')
+def artist_calendar(artist_id):
+    return calendar_response('artist', artist_id)
+
+
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/shows/export.<format>')
+def export_shows_dump(format):
+    # full dump of shows with artist and venue names, streamed as it is read
+    if format not in EXPORT_FORMATS:
+        abort(404)
+    compress = request.args.get('gzip', '0') in ('1', 'true', 'yes')
+    filename = 'shows.' + format
+    mimetype = EXPORT_FORMATS[format]
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    return Response(stream_with_context(export_shows(format, compress)), mimetype=mimetype,
+                    headers={'Content-Disposition': 'attachment; filename=' + filename})
+
+
+#  Metrics
+#  ----------------------------------------------------------------
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+@app.route('/autocomplete/artists')
+def autocomplete_artists():
+    # typeahead for the artist picker on the new show form
+    limit = min(request.args.get('limit', 10, type=int), 25)
+    return jsonify(results=artist_index.search(request.args.get('q', ''), limit=limit))
+
+
+@app.route('/autocomplete/venues')
+def autocomplete_venues():
+    limit = min(request.args.get('limit', 10, type=int), 25)
+    return jsonify(results=venue_index.search(request.args.get('q', ''), limit=limit))
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -541,16 +787,90 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
+logs.init_app(
+    app,
+    error_log=None if app.debug else app.config['ERROR_LOG_FILE'],
+    access_log=app.config['ACCESS_LOG_FILE'],
+    max_bytes=app.config['LOG_MAX_BYTES']
+)
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+
+@app.cli.command('export-shows')
+@click.option('--format', 'format', type=click.Choice(sorted(EXPORT_FORMATS)), default='csv')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='Defaults to stdout.')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output on the fly.')
+def export_shows_command(format, output, compress):
+    """Stream every show with artist and venue names as CSV or NDJSON."""
+    out = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in export_shows(format, compress):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
+
+
+@app.cli.command('rebuild-recommendations')
+def rebuild_recommendations_command():
+    """Recompute every similar-artist and similar-venue list."""
+    artists_count, venues_count = recommendations.rebuild()
+    click.echo('Rebuilt recommendations for %d artists and %d venues.' % (artists_count, venues_count))
+
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the show rollups behind the analytics pages from scratch."""
+    click.echo('Rolled up %d shows.' % rollups.rebuild())
+
+
+@app.cli.command('geocode-venues')
+@click.option('--all', 'everything', is_flag=True, help='Re-geocode venues that already have a location.')
+def geocode_venues_command(everything):
+    """Locate venues from the bundled city centroid table."""
+    located, missing = geo.backfill(everything)
+    click.echo('Located %d venues; %d are in cities not in the table.' % (located, missing))
+
+
+@app.cli.command('dedupe')
+@click.option('--apply', 'apply_merge', is_flag=True, help='Merge the duplicates; without it, only list them.')
+def dedupe_command(apply_merge):
+    """Find near-duplicate venues and artists and merge each group into its oldest row."""
+    merged = 0
+    for kind, model in (('venue', Venue), ('artist', Artist)):
+        filled = dedupe.backfill_keys(model)
+        if filled:
+            click.echo('Computed name keys for %d %ss.' % (filled, kind))
+        names = dict(db.session.execute(db.select(model.id, model.name)).all())
+        for ids in dedupe.duplicate_groups(model):
+            survivor, duplicates = ids[0], ids[1:]
+            click.echo('%s %d "%s" <- %s' % (kind, survivor, names[survivor],
+                                             ', '.join('%d "%s"' % (i, names[i]) for i in duplicates)))
+            if apply_merge:
+                click.echo('  moved %d shows' % dedupe.merge(model, survivor, duplicates))
+                merged += len(duplicates)
+    if merged:
+        # shows changed hands, so the derived tables are recomputed
+        rollups.rebuild()
+        recommendations.rebuild()
+        click.echo('Merged %d rows. Web workers reload their name indexes within %d seconds.'
+                   % (merged, prefix_index.INDEX_TTL))
+    elif not apply_merge:
+        click.echo('Dry run; pass --apply to merge.')
+
+
+@app.cli.command('profile-token')
+def profile_token_command():
+    """Print a signed X-Profile header value, valid for one hour."""
+    if not app.config['PROFILE_SECRET']:
+        raise click.ClickException('PROFILE_SECRET is not set.')
+    click.echo(make_token(app.config['PROFILE_SECRET']))
+
+
 # ----------------------------------------------------------------------------#
 # Launch.
 # ----------------------------------------------------------------------------#
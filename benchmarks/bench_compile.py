@@ -0,0 +1,122 @@
+"""Per-request statement compile overhead, before and after moving to Core.
+
+"Before" is the raw SQL the views used to send as strings. "After" is the
+prebuilt Core statements in readers.py, search.py and listings.py. For each
+statement we time execution with SQLAlchemy's compiled cache enabled (the
+normal path) and with it disabled (compile on every call); the difference is
+the compile cost paid per request when the cache is missed.
+
+    python benchmarks/bench_compile.py                  # SQLite in memory
+    BENCH_DATABASE_URI=postgresql://... python benchmarks/bench_compile.py
+
+The raw statements use ILIKE and now(), so on SQLite only the Core side runs.
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from models import Venue, Show, Artist, db  # noqa: E402
+import listings  # noqa: E402
+import readers  # noqa: E402
+import search  # noqa: E402
+
+ITERATIONS = int(os.environ.get('BENCH_ITERATIONS', '2000'))
+
+SEARCH_PARAMS = {'val': '%a%', 'limit': search.SEARCH_PAGE_SIZE, 'offset': 0}
+
+BEFORE = {
+    'venues': ("""
+        SELECT "Venue".id AS "id", "Venue".name AS name, "Venue".city AS city,
+        "Venue".state AS state, count("Show".id) AS num_upcoming_shows FROM "Venue"
+        LEFT JOIN "Show" ON "Venue".id = "Show".venue_id
+        AND "Show".start_time > now()
+        GROUP BY "Venue".id
+    """, {}),
+    'search_venues': ("""
+        SELECT  "Venue".id, "Venue".name, COUNT("Show".id) as num_upcoming_shows
+        FROM "Venue"
+        LEFT OUTER JOIN "Show" ON "Venue".id = "Show".venue_id
+        AND "Show".start_time > now()
+        WHERE "Venue".name ILIKE :val
+        GROUP BY "Venue".id
+    """, {'val': '%a%'}),
+    'search_artists': ("""
+        SELECT  "Artist".id, "Artist".name, COUNT("Show".artist_id) as num_upcoming_shows
+        FROM "Artist"
+        LEFT OUTER JOIN "Show" ON "Artist".id = "Show".artist_id
+        WHERE "Artist".name ILIKE :val
+        GROUP BY "Artist".id
+    """, {'val': '%a%'}),
+    'shows': ("""
+        SELECT "Show".id , "Show".venue_id, "Show".artist_id, "Show".start_time,
+        "Venue".name AS venue_name, "Venue".id AS venue_id,
+        "Artist".id AS artist_id, "Artist".name AS artist_name, "Artist".image_link AS artist_image_link
+        FROM "Show"
+        JOIN "Venue" ON "Venue".id = "Show".venue_id
+        JOIN "Artist" ON "Artist".id = "Show".artist_id
+    """, {}),
+}
+
+AFTER = {
+    'venues': (readers.VENUES_WITH_UPCOMING, {}),
+    'search_venues': (search.VENUE_SEARCH[1], SEARCH_PARAMS),
+    'search_artists': (search.ARTIST_SEARCH[1], SEARCH_PARAMS),
+    'shows': (listings.SHOWS_IN_RANGE, {}),
+}
+
+
+def seed(engine):
+    db.metadata.create_all(engine)
+    now = datetime.now()
+    with engine.begin() as conn:
+        if conn.execute(text('SELECT count(*) FROM "Venue"')).scalar():
+            return
+        conn.execute(Artist.__table__.insert(), [
+            {'name': 'Artist %d' % i, 'city': 'City', 'state': 'CA', 'genres': 'Jazz'} for i in range(20)])
+        conn.execute(Venue.__table__.insert(), [
+            {'name': 'Venue %d' % i, 'city': 'City %d' % (i % 4), 'state': 'CA', 'genres': 'Jazz'}
+            for i in range(20)])
+        conn.execute(Show.__table__.insert(), [
+            {'venue_id': i % 20 + 1, 'artist_id': i * 7 % 20 + 1, 'start_time': now + timedelta(days=i - 50)}
+            for i in range(100)])
+
+
+def timed(conn, statement, params, cached):
+    options = {} if cached else {'compiled_cache': None}
+    conn = conn.execution_options(**options)
+    conn.execute(statement, params).all()
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        conn.execute(statement, params).all()
+    return (time.perf_counter() - started) / ITERATIONS * 1e6
+
+
+def main():
+    engine = create_engine(os.environ.get('BENCH_DATABASE_URI', 'sqlite://'))
+    seed(engine)
+    print('%s, %d iterations, microseconds per execution' % (engine.dialect.name, ITERATIONS))
+    print('%-16s %-7s %10s %10s %10s' % ('statement', 'variant', 'cached', 'uncached', 'compile'))
+    with engine.connect() as conn:
+        for name in AFTER:
+            for variant, (statement, params) in (('before', BEFORE[name]), ('after', AFTER[name])):
+                if isinstance(statement, str):
+                    statement = text(statement)
+                try:
+                    cached = timed(conn, statement, params, True)
+                    uncached = timed(conn, statement, params, False)
+                except Exception as err:
+                    print('%-16s %-7s %10s  (%s)' % (name, variant, 'n/a', type(err).__name__))
+                    continue
+                print('%-16s %-7s %10.1f %10.1f %10.1f' % (name, variant, cached, uncached, uncached - cached))
+
+
+if __name__ == '__main__':
+    main()
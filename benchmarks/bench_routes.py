@@ -0,0 +1,119 @@
+"""Listing page size and latency with and without response compression.
+
+Seeds a database with BENCH_VENUES venues, BENCH_ARTISTS artists and
+BENCH_SHOWS shows, then requests /venues, /artists and /shows through the
+full WSGI stack with no Accept-Encoding, with gzip and with brotli. For each
+it reports bytes on the wire, time to the first body chunk and time to the
+last one. The "off" rows bypass CompressionMiddleware entirely.
+
+    python benchmarks/bench_routes.py                   # temporary SQLite file
+    BENCH_DATABASE_URI=postgresql://... python benchmarks/bench_routes.py
+
+Against Postgres, point it at a scratch database; rows are only inserted
+when the Venue table is empty.
+"""
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# no access log for benchmark requests
+os.environ['ACCESS_LOG_FILE'] = ''
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import text  # noqa: E402
+from werkzeug.test import EnvironBuilder, run_wsgi_app  # noqa: E402
+
+from app import app  # noqa: E402
+from compress import CompressionMiddleware  # noqa: E402
+from models import Venue, Show, Artist, db  # noqa: E402
+
+ITERATIONS = int(os.environ.get('BENCH_ITERATIONS', '50'))
+VENUES = int(os.environ.get('BENCH_VENUES', '500'))
+ARTISTS = int(os.environ.get('BENCH_ARTISTS', '500'))
+SHOWS = int(os.environ.get('BENCH_SHOWS', '2000'))
+
+ROUTES = ('/venues', '/artists', '/shows?range=all')
+ENCODINGS = (('off', None), ('identity', None), ('gzip', 'gzip'), ('br', 'br'))
+GENRES = ('Jazz', 'Rock n Roll', 'Classical', 'Folk', 'Hip-Hop', 'Soul')
+STATES = ('CA', 'NY', 'TX', 'WA', 'IL')
+
+
+def seed():
+    db.create_all()
+    if db.session.execute(text('SELECT count(*) FROM "Venue"')).scalar():
+        return
+    now = datetime.now()
+    db.session.execute(Venue.__table__.insert(), [
+        {'name': 'The %s Room %d' % (GENRES[i % len(GENRES)], i), 'city': 'City %d' % (i % 40),
+         'state': STATES[i % len(STATES)], 'address': '%d Main Street' % i, 'phone': '555-555-5555',
+         'genres': GENRES[i % len(GENRES)], 'image_link': 'https://images.example.com/venues/%d.jpg' % i}
+        for i in range(VENUES)])
+    db.session.execute(Artist.__table__.insert(), [
+        {'name': '%s Collective %d' % (GENRES[i % len(GENRES)], i), 'city': 'City %d' % (i % 40),
+         'state': STATES[i % len(STATES)], 'genres': ', '.join(GENRES[i % 3:i % 3 + 2]),
+         'image_link': 'https://images.example.com/artists/%d.jpg' % i}
+        for i in range(ARTISTS)])
+    db.session.execute(Show.__table__.insert(), [
+        {'venue_id': i % VENUES + 1, 'artist_id': i * 7 % ARTISTS + 1,
+         'start_time': now + timedelta(hours=i * 5 - SHOWS)}
+        for i in range(SHOWS)])
+    db.session.commit()
+
+
+def fetch(wsgi_app, path, coding):
+    # (bytes on the wire, seconds to the first body chunk, seconds to the last)
+    headers = {'Accept-Encoding': coding} if coding else {}
+    environ = EnvironBuilder(path=path, headers=headers).get_environ()
+    started = time.perf_counter()
+    body, status, _ = run_wsgi_app(wsgi_app, environ)
+    size = 0
+    first = None
+    try:
+        for chunk in body:
+            if chunk and first is None:
+                first = time.perf_counter() - started
+            size += len(chunk)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return size, first or 0.0, time.perf_counter() - started
+
+
+def main():
+    database = None
+    uri = os.environ.get('BENCH_DATABASE_URI')
+    if not uri:
+        database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        database.close()
+        uri = 'sqlite:///' + database.name
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    with app.app_context():
+        seed()
+    # the Flask app itself, without the middleware installed around it in app.py
+    flask_app = type(app).wsgi_app.__get__(app)
+    variants = {name: flask_app if name == 'off' else CompressionMiddleware(flask_app) for name, _ in ENCODINGS}
+
+    print('%d venues, %d artists, %d shows, %d iterations, times in ms' % (VENUES, ARTISTS, SHOWS, ITERATIONS))
+    print('%-18s %-9s %10s %8s %8s' % ('route', 'encoding', 'bytes', 'first', 'total'))
+    try:
+        for path in ROUTES:
+            for name, coding in ENCODINGS:
+                wsgi_app = variants[name]
+                fetch(wsgi_app, path, coding)
+                samples = [fetch(wsgi_app, path, coding) for _ in range(ITERATIONS)]
+                size = samples[-1][0]
+                first = sum(sample[1] for sample in samples) / ITERATIONS * 1000
+                total = sum(sample[2] for sample in samples) / ITERATIONS * 1000
+                print('%-18s %-9s %10d %8.2f %8.2f' % (path, name, size, first, total))
+    finally:
+        if database:
+            os.remove(database.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import hashlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from cache import TTLCache
+from models import Venue, Show, Artist, db
+
+# ----------------------------------------------------------------------------#
+# iCalendar feeds.
+# ----------------------------------------------------------------------------#
+# Upcoming shows for one venue or artist, as an RFC 5545 calendar. Feeds are
+# cached per entity together with their ETag and Last-Modified, so a calendar
+# client that polls with If-None-Match gets a 304 without touching the DB.
+#
+# Last-Modified comes from the data, not from the time the feed was built.
+# Venues and artists carry changed_at, which edits and show inserts and
+# deletes move forward through touch(). A feed last changed at the latest of
+# its own row's changed_at, the changed_at of every venue or artist in it,
+# and the start of its most recent past show, which is when that show
+# dropped out of the feed. The value is the same in every process and
+# across cache rebuilds, so If-Modified-Since polling gets 304s.
+
+FEED_TTL = 300
+SHOW_DURATION = timedelta(hours=2)
+EPOCH = datetime(1970, 1, 1)
+
+Feed = namedtuple('Feed', ['body', 'etag', 'last_modified'])
+
+feed_cache = TTLCache(maxsize=4096, ttl=FEED_TTL)
+
+
+def _escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold(line):
+    # content lines longer than 75 octets continue on lines starting with a space
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts = []
+    while len(data) > 75:
+        cut = 75 if not parts else 74
+        while cut and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+    parts.append(data.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+def _format_time(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def _render(name, shows, stamp):
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Fyyur//Upcoming Shows//EN',
+        'CALSCALE:GREGORIAN',
+        'X-WR-CALNAME:' + _escape(name),
+    ]
+    for show in shows:
+        lines += [
+            'BEGIN:VEVENT',
+            'UID:show-%d@fyyur' % show.id,
+            'DTSTAMP:' + _format_time(stamp) + 'Z',
+            'DTSTART:' + _format_time(show.start_time),
+            'DTEND:' + _format_time(show.start_time + SHOW_DURATION),
+            'SUMMARY:' + _escape('%s at %s' % (show.artist_name, show.venue_name)),
+            'LOCATION:' + _escape(', '.join(filter(None, (show.address, show.city, show.state)))),
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
+
+
+def _upcoming_shows(column, entity_id):
+    # Served by the (venue_id, start_time) / (artist_id, start_time) indexes
+    return db.session.query(Show.id, Show.start_time, Artist.name.label('artist_name'),
+                            Venue.name.label('venue_name'), Venue.address, Venue.city, Venue.state,
+                            Venue.changed_at.label('venue_changed_at'),
+                            Artist.changed_at.label('artist_changed_at')) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .filter(column == entity_id, Show.start_time > func.now()) \
+        .order_by(Show.start_time) \
+        .all()
+
+
+def _last_started(column, entity_id):
+    return db.session.execute(select(func.max(Show.start_time))
+                              .where(column == entity_id, Show.start_time <= func.now())).scalar()
+
+
+def _build(kind, entity_id):
+    model, column = (Venue, Show.venue_id) if kind == 'venue' else (Artist, Show.artist_id)
+    entity = db.session.execute(select(model.name, model.changed_at).where(model.id == entity_id)).first()
+    if entity is None:
+        return None
+    shows = _upcoming_shows(column, entity_id)
+    changes = [entity.changed_at, _last_started(column, entity_id)]
+    changes += [show.venue_changed_at for show in shows] + [show.artist_changed_at for show in shows]
+    last_modified = max(filter(None, changes), default=EPOCH).replace(microsecond=0)
+    # DTSTAMP is the build time and changes on every build, so neither
+    # validator depends on it; the ETag hashes the data
+    stamp = datetime.utcnow().replace(microsecond=0)
+    etag = hashlib.sha1(repr((entity.name, [tuple(show) for show in shows])).encode('utf-8')).hexdigest()
+    return Feed(_render(entity.name, shows, stamp), etag, last_modified)
+
+
+def get_feed(kind, entity_id):
+    key = (kind, entity_id)
+    feed = feed_cache.get(key)
+    if feed is None:
+        feed = _build(kind, entity_id)
+        if feed is not None:
+            feed_cache.set(key, feed)
+    return feed
+
+
+def invalidate_feed(kind, entity_id):
+    feed_cache.pop((kind, entity_id))
+
+
+def touch(model, ids):
+    # Record, in the caller's transaction, that the feeds of these venues or
+    # artists changed. Sorted so concurrent callers lock rows in one order.
+    ids = sorted(set(ids))
+    if ids:
+        db.session.execute(update(model.__table__).where(model.id.in_(ids)).values(changed_at=func.now()))
@@ -0,0 +1,203 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import zlib
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# ----------------------------------------------------------------------------#
+# Response compression.
+# ----------------------------------------------------------------------------#
+# WSGI middleware that compresses text responses with brotli or gzip,
+# whichever the client prefers in Accept-Encoding (brotli on a tie, when
+# the brotli package is installed).
+#
+# Bodies are compressed as they are iterated, so a streamed page still goes
+# out while it is being rendered. Input is gathered into FLUSH_BYTES pieces
+# and each piece is flushed to the client. Responses are passed through
+# untouched when they are already encoded, are not a compressible type, or
+# are smaller than MIN_BYTES. A body of unknown length is held back until
+# MIN_BYTES have arrived, to find out which case applies.
+
+MIN_BYTES = 1024
+FLUSH_BYTES = 16 * 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/x-ndjson',
+                      'application/xml', 'image/svg+xml')
+
+
+def _accepted(header):
+    # {coding: q} from an Accept-Encoding header
+    codings = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            codings[coding.lower()] = q
+    return codings
+
+
+def negotiate(header):
+    codings = _accepted(header)
+    wildcard = codings.get('*', 0.0)
+    gzip_q = codings.get('gzip', wildcard)
+    br_q = codings.get('br', wildcard) if brotli is not None else 0.0
+    if br_q > 0 and br_q >= gzip_q:
+        return 'br'
+    if gzip_q > 0:
+        return 'gzip'
+    return None
+
+
+class _Gzip:
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _Brotli:
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+CODERS = {'gzip': _Gzip, 'br': _Brotli}
+
+
+class CompressionMiddleware:
+
+    def __init__(self, wsgi_app, min_bytes=MIN_BYTES):
+        self.wsgi_app = wsgi_app
+        self.min_bytes = min_bytes
+
+    def __call__(self, environ, start_response):
+        coding = negotiate(environ.get('HTTP_ACCEPT_ENCODING'))
+        if coding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.wsgi_app(environ, start_response)
+        response = {}
+
+        def capture(status, headers, exc_info=None):
+            if exc_info is not None and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = status
+            response['headers'] = headers
+            response['exc_info'] = exc_info
+            # the body is returned, not written; nothing in this app uses write()
+            return None
+
+        body = self.wsgi_app(environ, capture)
+        return _Body(self, body, response, start_response, coding)
+
+    def should_compress(self, status, headers):
+        if status[:3] in ('204', '206', '304') or status[0] in '13':
+            return False
+        headers = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in headers or 'no-transform' in headers.get('cache-control', ''):
+            return False
+        if not headers.get('content-type', '').startswith(COMPRESSIBLE_TYPES):
+            return False
+        length = headers.get('content-length')
+        return length is None or int(length) >= self.min_bytes
+
+
+def _compressed_headers(headers, coding):
+    result = []
+    vary = None
+    for name, value in headers:
+        lower = name.lower()
+        if lower == 'content-length':
+            continue
+        if lower == 'etag' and not value.startswith('W/'):
+            # the encoded bytes differ, so the validator can only be weak
+            value = 'W/' + value
+        if lower == 'vary':
+            vary = value
+            continue
+        result.append((name, value))
+    if vary is None:
+        vary = 'Accept-Encoding'
+    elif 'accept-encoding' not in vary.lower():
+        vary += ', Accept-Encoding'
+    result.append(('Vary', vary))
+    result.append(('Content-Encoding', coding))
+    return result
+
+
+class _Body:
+    # iterable returned to the server in place of the app's body
+
+    def __init__(self, middleware, body, response, start_response, coding):
+        self.middleware = middleware
+        self.body = body
+        self.response = response
+        self.start_response = start_response
+        self.coding = coding
+
+    def _start(self, headers):
+        self.response['sent'] = True
+        self.start_response(self.response['status'], headers, self.response['exc_info'])
+
+    def __iter__(self):
+        chunks = iter(self.body)
+        status, headers = self.response['status'], self.response['headers']
+        if not self.middleware.should_compress(status, headers):
+            self._start(headers)
+            yield from chunks
+            return
+
+        # hold back a body of unknown length until it is known to be big enough
+        head = []
+        size = 0
+        explicit_length = any(name.lower() == 'content-length' for name, _ in headers)
+        if not explicit_length:
+            for chunk in chunks:
+                head.append(chunk)
+                size += len(chunk)
+                if size >= self.middleware.min_bytes:
+                    break
+            else:
+                self._start(headers)
+                yield from head
+                return
+
+        self._start(_compressed_headers(headers, self.coding))
+        coder = CODERS[self.coding]()
+        pending = head
+        size = sum(map(len, pending))
+        for chunk in chunks:
+            pending.append(chunk)
+            size += len(chunk)
+            if size >= FLUSH_BYTES:
+                yield coder.compress(b''.join(pending))
+                pending = []
+                size = 0
+        tail = coder.compress(b''.join(pending)) if pending else b''
+        yield tail + coder.finish()
+
+    def close(self):
+        if hasattr(self.body, 'close'):
+            self.body.close()
@@ -0,0 +1,134 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from itertools import groupby
+
+from sqlalchemy import delete, func, select, update
+
+from calendar_feed import touch
+from models import Venue, Show, Recommendation, db
+
+# ----------------------------------------------------------------------------#
+# Duplicate detection.
+# ----------------------------------------------------------------------------#
+# Every venue and artist stores name_key, its name normalized for
+# comparison, and block_key, a short prefix of name_key. Both are indexed
+# together with state. A new row is only compared with the rows in the same
+# block, state and city, which is usually a handful, and difflib scores each
+# pair. Pairs scoring at least DUPLICATE_THRESHOLD count as duplicates.
+#
+# Blocking on a prefix misses duplicates whose names differ in the first
+# BLOCK_PREFIX letters after normalization. That is the price of never
+# comparing against the whole table.
+
+BLOCK_PREFIX = 4
+DUPLICATE_THRESHOLD = 0.88
+MAX_CANDIDATES = 200
+KEY_BATCH_SIZE = 1000
+
+_STOP_WORDS = {'the', 'a', 'an'}
+
+
+def name_key(name):
+    # "The Musical Hop!" and "musical  hop" both become "musical hop"
+    text = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode().lower()
+    words = re.sub(r'[^a-z0-9]+', ' ', text.replace('&', ' and ')).split()
+    if len(words) > 1 and words[0] in _STOP_WORDS:
+        words = words[1:]
+    return ' '.join(words)
+
+
+def key_columns(name):
+    key = name_key(name)
+    return {'name_key': key, 'block_key': key[:BLOCK_PREFIX]}
+
+
+def similarity(a, b):
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _same_place(model, city, state):
+    return [model.state == state, func.lower(model.city) == (city or '').strip().lower()]
+
+
+def find_duplicates(model, name, city, state, exclude_id=None):
+    # [(id, name, score)] of existing rows that look like the same venue or artist, best first
+    keys = key_columns(name)
+    query = select(model.id, model.name, model.name_key) \
+        .where(model.block_key == keys['block_key'], *_same_place(model, city, state)) \
+        .limit(MAX_CANDIDATES)
+    if exclude_id is not None:
+        query = query.where(model.id != exclude_id)
+    matches = []
+    for row in db.session.execute(query):
+        score = similarity(keys['name_key'], row.name_key or '')
+        if score >= DUPLICATE_THRESHOLD:
+            matches.append((row.id, row.name, score))
+    matches.sort(key=lambda match: (-match[2], match[0]))
+    return matches
+
+
+# ----------------------------------------------------------------------------#
+# Bulk dedupe.
+# ----------------------------------------------------------------------------#
+
+def backfill_keys(model):
+    # fill name_key and block_key on rows created before they existed
+    filled = 0
+    while True:
+        rows = db.session.execute(select(model.id, model.name).where(model.name_key.is_(None))
+                                  .limit(KEY_BATCH_SIZE)).all()
+        if not rows:
+            return filled
+        for row in rows:
+            db.session.execute(update(model.__table__).where(model.id == row.id).values(**key_columns(row.name)))
+        db.session.commit()
+        filled += len(rows)
+
+
+def duplicate_groups(model):
+    # Lists of ids that are the same venue or artist, oldest first. Blocks
+    # are read in index order and each block is clustered on its own.
+    rows = db.session.execute(
+        select(model.id, model.name_key, model.block_key, model.state, func.lower(model.city).label('city'))
+        .where(model.name_key.isnot(None))
+        .order_by(model.block_key, model.state, func.lower(model.city), model.id)
+        .execution_options(stream_results=True, yield_per=KEY_BATCH_SIZE))
+    groups = []
+    for _, block in groupby(rows, key=lambda row: (row.block_key, row.state, row.city)):
+        block = list(block)
+        if len(block) < 2:
+            continue
+        parent = list(range(len(block)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i in range(len(block)):
+            for j in range(i + 1, len(block)):
+                if similarity(block[i].name_key, block[j].name_key) >= DUPLICATE_THRESHOLD:
+                    parent[find(j)] = find(i)
+        clusters = {}
+        for i, row in enumerate(block):
+            clusters.setdefault(find(i), []).append(row.id)
+        groups.extend(ids for ids in clusters.values() if len(ids) > 1)
+    return groups
+
+
+def merge(model, survivor_id, duplicate_ids):
+    # move the duplicates' shows onto the survivor and delete the duplicates, in one transaction
+    show_column, kind = (Show.venue_id, 'venue') if model is Venue else (Show.artist_id, 'artist')
+    moved = db.session.execute(update(Show.__table__).where(show_column.in_(duplicate_ids))
+                               .values({show_column.key: survivor_id})).rowcount
+    db.session.execute(delete(Recommendation.__table__).where(
+        Recommendation.kind == kind, Recommendation.source_id.in_(duplicate_ids)))
+    db.session.execute(delete(model.__table__).where(model.id.in_(duplicate_ids)))
+    touch(model, [survivor_id])
+    db.session.commit()
+    return moved
@@ -0,0 +1,164 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+import recommendations
+import rollups
+import tasks
+from calendar_feed import touch
+from models import Venue, Show, Artist, Deletion, VenueDailyRollup, ArtistDailyRollup, VenueArtistRollup, db
+
+# ----------------------------------------------------------------------------#
+# Chunked deletes.
+# ----------------------------------------------------------------------------#
+# Deleting a venue or artist with a long history removes its shows first, in
+# batches of DELETE_BATCH_SIZE rows. Each batch also takes its shows out of
+# the rollups, and each batch is its own short transaction. Row locks are
+# held only for one batch, and other writers get in between batches. The
+# last transaction locks the venue or artist row, takes out any shows that
+# were added meanwhile through the same rollup path, and deletes the row,
+# so the foreign key cascade never removes a show behind the rollups' back.
+#
+# Progress is kept in the Deletion table, keyed by (kind, id), so any worker
+# can answer the status endpoint and a second delete is refused everywhere.
+# New shows are refused while a delete is pending. A delete that fails part
+# way leaves a consistent, smaller entity behind, and running it again picks
+# up where it stopped. One whose worker died is taken over once its status
+# has not moved for DELETE_STALE_AFTER seconds.
+
+DELETE_BATCH_SIZE = 1000
+# pause between batches so the delete does not monopolize the database
+DELETE_BATCH_PAUSE = 0.01
+DELETE_STATUS_TTL = 3600
+DELETE_STALE_AFTER = 600
+
+MODELS = {'venue': (Venue, Show.venue_id), 'artist': (Artist, Show.artist_id)}
+ACTIVE_STATES = ('queued', 'running', 'retrying')
+
+
+def _key(kind, entity_id):
+    return (Deletion.kind == kind, Deletion.entity_id == entity_id)
+
+
+def _as_dict(row):
+    return {
+        'kind': row.kind,
+        'id': row.entity_id,
+        'state': row.state,
+        'shows_total': row.shows_total,
+        'shows_deleted': row.shows_deleted,
+        'error': row.error,
+    }
+
+
+def status(kind, entity_id):
+    # the progress of a delete, or None if none is known
+    row = db.session.execute(select(Deletion).where(*_key(kind, entity_id))).scalar()
+    return _as_dict(row) if row is not None else None
+
+
+def pending(kind, entity_id):
+    # True while a delete of this venue or artist is queued or running
+    return db.session.execute(select(Deletion.state).where(
+        *_key(kind, entity_id), Deletion.state.in_(ACTIVE_STATES))).first() is not None
+
+
+def start(kind, entity_id):
+    # Record a delete as queued and return its status. Returns None if one is
+    # already queued or running, so that a double click starts one job.
+    model, show_column = MODELS[kind]
+    now = datetime.utcnow()
+    values = {
+        'state': 'queued',
+        'shows_total': db.session.execute(select(func.count()).where(show_column == entity_id)).scalar(),
+        'shows_deleted': 0,
+        'error': None,
+        'updated_at': now,
+    }
+    claimed = db.session.execute(update(Deletion.__table__).where(
+        *_key(kind, entity_id),
+        or_(Deletion.state.notin_(ACTIVE_STATES),
+            Deletion.updated_at < now - timedelta(seconds=DELETE_STALE_AFTER))).values(**values)).rowcount
+    try:
+        if not claimed:
+            db.session.execute(Deletion.__table__.insert().values(kind=kind, entity_id=entity_id, **values))
+        db.session.commit()
+    except IntegrityError:
+        # another request holds the row, and its delete is still active
+        db.session.rollback()
+        return None
+    # finished deletes are only kept around for a while
+    db.session.execute(delete(Deletion.__table__).where(
+        Deletion.state.notin_(ACTIVE_STATES), Deletion.updated_at < now - timedelta(seconds=DELETE_STATUS_TTL)))
+    db.session.commit()
+    return status(kind, entity_id)
+
+
+def _progress(kind, entity_id, **values):
+    db.session.execute(update(Deletion.__table__).where(*_key(kind, entity_id))
+                       .values(updated_at=datetime.utcnow(), **values))
+
+
+def _forget_shows(model, rows):
+    # take shows out of the rollups and of the other side's feeds, then delete them
+    rollups.forget_rows([(row.venue_id, row.artist_id, row.start_time) for row in rows])
+    if model is Venue:
+        touch(Artist, [row.artist_id for row in rows])
+    else:
+        touch(Venue, [row.venue_id for row in rows])
+    db.session.execute(delete(Show.__table__).where(Show.id.in_([row.id for row in rows])))
+
+
+def _shows(show_column, entity_id, limit=None):
+    statement = select(Show.id, Show.venue_id, Show.artist_id, Show.start_time) \
+        .where(show_column == entity_id) \
+        .order_by(Show.id)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return db.session.execute(statement).all()
+
+
+def run(kind, entity_id):
+    # delete a venue or artist and its shows in batches; returns its name, or None if it was already gone
+    model, show_column = MODELS[kind]
+    if status(kind, entity_id) is None:
+        start(kind, entity_id)
+    _progress(kind, entity_id, state='running', error=None)
+    db.session.commit()
+    try:
+        while True:
+            rows = _shows(show_column, entity_id, DELETE_BATCH_SIZE)
+            if not rows:
+                break
+            _forget_shows(model, rows)
+            _progress(kind, entity_id, shows_deleted=Deletion.shows_deleted + len(rows))
+            db.session.commit()
+            time.sleep(DELETE_BATCH_PAUSE)
+
+        # Lock the row first: a show insert committed before this sees its
+        # show below, and one after it fails on the foreign key.
+        name = db.session.execute(select(model.name).where(model.id == entity_id).with_for_update()).scalar()
+        rows = _shows(show_column, entity_id)
+        if rows:
+            _forget_shows(model, rows)
+        own_rollup = VenueDailyRollup if model is Venue else ArtistDailyRollup
+        own_key = 'venue_id' if model is Venue else 'artist_id'
+        db.session.execute(delete(own_rollup.__table__).where(own_rollup.__table__.c[own_key] == entity_id))
+        db.session.execute(delete(VenueArtistRollup.__table__)
+                           .where(VenueArtistRollup.__table__.c[own_key] == entity_id))
+        recommendations.forget(kind, entity_id)
+        db.session.execute(delete(model.__table__).where(model.id == entity_id))
+        _progress(kind, entity_id, state='done', shows_deleted=Deletion.shows_deleted + len(rows))
+        db.session.commit()
+    except Exception as err:
+        db.session.rollback()
+        # the task queue retries; only the last attempt reports a failure
+        _progress(kind, entity_id, state='failed' if tasks.final_attempt() else 'retrying', error=str(err))
+        db.session.commit()
+        raise
+    return name
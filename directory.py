@@ -0,0 +1,111 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import string
+import threading
+import time
+
+from sqlalchemy import and_, func, or_, select
+
+from models import Artist, db
+
+# ----------------------------------------------------------------------------#
+# Artist directory.
+# ----------------------------------------------------------------------------#
+# The /artists page lists one letter at a time in (lower(name), id) order.
+# The ix_artist_initial_lower_name_id index serves it, so each page is a
+# range scan that resumes after the last row of the previous page. It never
+# uses an OFFSET. Names that do not start with a-z are filed under '#'.
+#
+# A page selects its letter by equality on the first character of
+# lower(name), the same expression the counts group by. Range comparisons
+# such as lower(name) >= 'a' would depend on the database collation, which
+# under en_US sorts names starting with punctuation or digits between the
+# letters, and the pages would disagree with the counts.
+
+ARTIST_PAGE_SIZE = 50
+LETTERS = tuple(string.ascii_uppercase) + ('#',)
+# seconds before the per-process counts are reloaded, to pick up other workers' writes
+LETTER_COUNTS_TTL = 60
+
+
+def letter_of(name):
+    first = (name or '')[:1].lower()
+    return first.upper() if 'a' <= first <= 'z' else '#'
+
+
+def _initial(name_column):
+    return func.substr(func.lower(name_column), 1, 1)
+
+
+def _letter_filter(name_column, letter):
+    if letter == '#':
+        return _initial(name_column).notin_(list(string.ascii_lowercase))
+    return _initial(name_column) == letter.lower()
+
+
+class LetterCounts:
+    # Per-process artist counts per letter, loaded with one GROUP BY and then
+    # adjusted by this process's create and edit handlers. Writes made by
+    # other workers only show up at the next reload, every LETTER_COUNTS_TTL
+    # seconds, so the counts are approximate in between.
+
+    def __init__(self, ttl=LETTER_COUNTS_TTL):
+        self._lock = threading.Lock()
+        self._ttl = ttl
+        self._counts = None
+        self._loaded_at = 0.0
+
+    def _load(self):
+        first = _initial(Artist.name)
+        counts = dict.fromkeys(LETTERS, 0)
+        query = select(first, func.count()).where(Artist.name.isnot(None)).group_by(first)
+        for initial, count in db.session.execute(query):
+            counts[letter_of(initial)] += count
+        return counts
+
+    def get(self):
+        with self._lock:
+            if self._counts is None or time.monotonic() - self._loaded_at > self._ttl:
+                self._counts = self._load()
+                self._loaded_at = time.monotonic()
+            return dict(self._counts)
+
+    def add(self, name):
+        self._adjust(letter_of(name), 1)
+
+    def remove(self, name):
+        self._adjust(letter_of(name), -1)
+
+    def rename(self, old_name, new_name):
+        if letter_of(old_name) != letter_of(new_name):
+            self.remove(old_name)
+            self.add(new_name)
+
+    def _adjust(self, letter, delta):
+        with self._lock:
+            if self._counts is not None:
+                self._counts[letter] += delta
+
+    def clear(self):
+        with self._lock:
+            self._counts = None
+
+
+letter_counts = LetterCounts()
+
+
+def artist_page(letter, after_name=None, after_id=None, limit=ARTIST_PAGE_SIZE):
+    lower_name = func.lower(Artist.name)
+    query = select(Artist.id, Artist.name, lower_name.label('sort_name')) \
+        .where(_letter_filter(Artist.name, letter)) \
+        .order_by(lower_name, Artist.id) \
+        .limit(limit + 1)
+    if after_name is not None and after_id is not None:
+        query = query.where(or_(lower_name > after_name, and_(lower_name == after_name, Artist.id > after_id)))
+    rows = db.session.execute(query).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = {'after': rows[-1].sort_name, 'after_id': rows[-1].id}
+    return rows, next_cursor
@@ -0,0 +1,93 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import json
+
+from sqlalchemy import func, select, update
+
+from models import db
+
+# ----------------------------------------------------------------------------#
+# Versioned partial updates.
+# ----------------------------------------------------------------------------#
+# Edit forms carry the row's version and a snapshot of the values they were
+# rendered with. On submit, only the columns whose value differs from the
+# snapshot are written. The write is a single
+#
+#     UPDATE ... SET <changed>, version = version + 1 WHERE id = :id AND version = :v
+#
+# so nothing is read first. If someone else saved in between, the version
+# no longer matches, no row is updated, and the edit is reported as a
+# conflict instead of silently overwriting their change.
+
+VENUE_FIELDS = ('name', 'city', 'state', 'address', 'phone', 'genres', 'image_link', 'facebook_link',
+                'website_link', 'seeking_talent', 'seeking_description')
+ARTIST_FIELDS = ('name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link', 'website_link',
+                 'seeking_venue', 'seeking_description')
+
+
+def fill_form(form, row, fields, genres_list):
+    # load a readers row into an edit form, along with its version and snapshot
+    for field in fields:
+        form[field].data = genres_list(row.genres) if field == 'genres' else row._mapping[field]
+    form.version.data = row.version
+    form.original.data = json.dumps({field: row._mapping[field] for field in fields}, separators=(',', ':'))
+
+
+def form_values(form, fields):
+    # submitted form data in column form
+    return {field: ', '.join(form.genres.data) if field == 'genres' else form[field].data for field in fields}
+
+
+def _snapshot(form):
+    try:
+        original = json.loads(form.original.data)
+    except (TypeError, ValueError):
+        return None
+    return original if isinstance(original, dict) else None
+
+
+def original_value(form, field):
+    return (_snapshot(form) or {}).get(field)
+
+
+def _same(a, b):
+    # an empty text input submits '' for a column that may hold NULL
+    return a == b or (a in (None, '') and b in (None, ''))
+
+
+def changed_values(form, fields):
+    values = form_values(form, fields)
+    original = _snapshot(form)
+    if original is None:
+        # no usable snapshot, so write every field
+        return values
+    return {field: value for field, value in values.items()
+            if field not in original or not _same(original[field], value)}
+
+
+SAVED = 'saved'
+CONFLICT = 'conflict'
+MISSING = 'missing'
+
+
+def update_versioned(model, entity_id, version, values):
+    # SAVED if the row was still at `version` and has been updated, CONFLICT
+    # if someone else saved it in between, MISSING if it no longer exists
+    try:
+        version = int(version)
+    except (TypeError, ValueError):
+        # a form rendered before versions existed can't prove it is current
+        version = None
+    if version is not None:
+        # changed_at moves the Last-Modified of the calendar feeds the row appears in
+        result = db.session.execute(
+            update(model.__table__)
+            .where(model.id == entity_id, model.version == version)
+            .values(version=model.version + 1, changed_at=func.now(), **values)
+        )
+        if result.rowcount == 1:
+            return SAVED
+    # only on the unhappy path: tell a stale form from a deleted row
+    exists = db.session.execute(select(model.id).where(model.id == entity_id)).first() is not None
+    return CONFLICT if exists else MISSING
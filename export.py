@@ -0,0 +1,93 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import csv
+import io
+import json
+import zlib
+
+from models import Venue, Show, Artist, db
+
+# ----------------------------------------------------------------------------#
+# Show export.
+# ----------------------------------------------------------------------------#
+# Rows are pulled through a server-side cursor in batches of EXPORT_BATCH_SIZE
+# and written out as they arrive, so memory stays flat however many shows
+# there are. Nothing here builds the whole dump as a list or a string.
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_COLUMNS = ('show_id', 'start_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name')
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def show_rows(batch_size=EXPORT_BATCH_SIZE):
+    query = db.session.query(Show.id, Show.start_time, Venue.id, Venue.name, Artist.id, Artist.name) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .order_by(Show.id) \
+        .execution_options(stream_results=True) \
+        .yield_per(batch_size)
+    try:
+        for row in query:
+            yield row
+    finally:
+        db.session.close()
+
+
+def _csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for show_id, start_time, venue_id, venue_name, artist_id, artist_name in rows:
+        writer.writerow((show_id, start_time.isoformat(), venue_id, venue_name, artist_id, artist_name))
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(rows):
+    lines = []
+    size = 0
+    for show_id, start_time, venue_id, venue_name, artist_id, artist_name in rows:
+        line = json.dumps({
+            'show_id': show_id,
+            'start_time': start_time.isoformat(),
+            'venue_id': venue_id,
+            'venue_name': venue_name,
+            'artist_id': artist_id,
+            'artist_name': artist_name,
+        }) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+            size = 0
+    yield ''.join(lines)
+
+
+def _gzip(chunks):
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_shows(format='csv', compress=False):
+    # Returns a generator of bytes chunks for the requested format
+    if format not in EXPORT_FORMATS:
+        raise ValueError('Unknown export format ' + format)
+    chunks = _csv_chunks(show_rows()) if format == 'csv' else _ndjson_chunks(show_rows())
+    chunks = (chunk.encode('utf-8') for chunk in chunks if chunk)
+    if compress:
+        chunks = _gzip(chunks)
+    return chunks
@@ -1,6 +1,6 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
+from wtforms import StringField, HiddenField, SelectField, SelectMultipleField, DateTimeField, BooleanField
 from wtforms.validators import DataRequired, AnyOf, URL
 
 
@@ -127,6 +127,11 @@ class VenueForm(Form):
         'seeking_description'
     )
 
+    # set on edit forms only; see edits.py
+    version = HiddenField('version')
+
+    original = HiddenField('original')
+
 
 class ArtistForm(Form):
     name = StringField(
@@ -234,3 +239,8 @@ class ArtistForm(Form):
     seeking_description = StringField(
         'seeking_description'
     )
+
+    # set on edit forms only; see edits.py
+    version = HiddenField('version')
+
+    original = HiddenField('original')
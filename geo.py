@@ -0,0 +1,146 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import csv
+import math
+import os
+import threading
+
+from sqlalchemy import and_, func, or_, select, true
+
+from models import Venue, Show, db
+
+# ----------------------------------------------------------------------------#
+# Venue locations.
+# ----------------------------------------------------------------------------#
+# Venues are geocoded offline to the centroid of their city, looked up in a
+# bundled table (data/city_centroids.csv). There are no network calls and no
+# quota, at the cost of city-level precision. That is enough for "within N
+# miles".
+#
+# Each geocoded venue also stores a grid cell: the GRID_DEGREES x GRID_DEGREES
+# square it falls in, numbered row by row. Cells in one row are consecutive
+# numbers, so the cells under a search circle's bounding box come down to one
+# indexed BETWEEN per row. Only venues in those cells are read, and the exact
+# great-circle distance is checked in Python.
+
+CENTROIDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'city_centroids.csv')
+GRID_DEGREES = 0.5
+GRID_COLUMNS = int(360 / GRID_DEGREES)
+EARTH_RADIUS_MILES = 3958.8
+MAX_RADIUS_MILES = 250
+
+_centroids = None
+_centroids_lock = threading.Lock()
+
+
+def _city_key(city, state):
+    words = (city or '').lower().replace('.', '').split()
+    if words and words[0] == 'saint':
+        words[0] = 'st'
+    return ' '.join(words), (state or '').strip().upper()
+
+
+def _load_centroids():
+    global _centroids
+    with _centroids_lock:
+        if _centroids is None:
+            with open(CENTROIDS_FILE, newline='') as f:
+                _centroids = {_city_key(row['city'], row['state']): (float(row['latitude']), float(row['longitude']))
+                              for row in csv.DictReader(f)}
+    return _centroids
+
+
+def geocode(city, state):
+    # (latitude, longitude) of the city centroid, or None if it isn't in the table
+    return _load_centroids().get(_city_key(city, state))
+
+
+def grid_cell(latitude, longitude):
+    row = int((latitude + 90) // GRID_DEGREES)
+    column = int((longitude + 180) // GRID_DEGREES) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def location_columns(city, state):
+    # latitude, longitude and grid_cell values for a venue in city, state
+    point = geocode(city, state)
+    if point is None:
+        return {'latitude': None, 'longitude': None, 'grid_cell': None}
+    return {'latitude': point[0], 'longitude': point[1], 'grid_cell': grid_cell(*point)}
+
+
+def distance_miles(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _cell_ranges(latitude, longitude, radius):
+    # (first, last) cell numbers covering the circle's bounding box, one per grid row
+    lat_delta = math.degrees(radius / EARTH_RADIUS_MILES)
+    south = max(-90.0, latitude - lat_delta)
+    north = min(90.0 - 1e-9, latitude + lat_delta)
+    cos_lat = min(math.cos(math.radians(south)), math.cos(math.radians(north)))
+    lng_delta = 180.0 if cos_lat <= 0 else min(180.0, lat_delta / cos_lat)
+    ranges = []
+    for row in range(int((south + 90) // GRID_DEGREES), int((north + 90) // GRID_DEGREES) + 1):
+        if lng_delta >= 180.0:
+            spans = [(0, GRID_COLUMNS - 1)]
+        else:
+            west = int((longitude - lng_delta + 180) // GRID_DEGREES)
+            east = int((longitude + lng_delta + 180) // GRID_DEGREES)
+            if west < 0:
+                spans = [(west % GRID_COLUMNS, GRID_COLUMNS - 1), (0, east)]
+            elif east >= GRID_COLUMNS:
+                spans = [(west, GRID_COLUMNS - 1), (0, east % GRID_COLUMNS)]
+            else:
+                spans = [(west, east)]
+        ranges.extend((row * GRID_COLUMNS + first, row * GRID_COLUMNS + last) for first, last in spans)
+    return ranges
+
+
+def nearby_venues(latitude, longitude, radius, limit=50):
+    # venues within radius miles, nearest first, with their upcoming show counts
+    cells = or_(*[Venue.grid_cell.between(first, last) for first, last in _cell_ranges(latitude, longitude, radius)])
+    rows = db.session.execute(
+        select(Venue.id, Venue.name, Venue.city, Venue.state, Venue.latitude, Venue.longitude,
+               func.count(Show.id).label('num_upcoming_shows'))
+        .outerjoin(Show, and_(Venue.id == Show.venue_id, Show.start_time > func.now()))
+        .where(cells)
+        .group_by(Venue.id)
+    ).all()
+    results = []
+    for row in rows:
+        distance = distance_miles(latitude, longitude, row.latitude, row.longitude)
+        if distance <= radius:
+            results.append({
+                'id': row.id,
+                'name': row.name,
+                'city': row.city,
+                'state': row.state,
+                'distance_miles': round(distance, 1),
+                'num_upcoming_shows': row.num_upcoming_shows,
+            })
+    results.sort(key=lambda item: (item['distance_miles'], item['id']))
+    return results[:limit]
+
+
+def backfill(everything=False):
+    # Geocode venues with no location yet, or all of them, with one UPDATE
+    # per distinct city. Returns (venues located, venues whose city is unknown).
+    pending = true() if everything else Venue.latitude.is_(None)
+    cities = db.session.execute(
+        select(Venue.city, Venue.state, func.count()).where(pending).group_by(Venue.city, Venue.state)).all()
+    located = missing = 0
+    for city, state, count in cities:
+        columns = location_columns(city, state)
+        if columns['latitude'] is None:
+            missing += count
+            continue
+        located += count
+        db.session.execute(Venue.__table__.update()
+                           .where(Venue.city == city, Venue.state == state, pending)
+                           .values(**columns))
+    db.session.commit()
+    return located, missing
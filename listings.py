@@ -0,0 +1,133 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import bindparam, func, literal, select
+
+from cache import TTLCache
+from models import Venue, Show, Artist, db
+
+# ----------------------------------------------------------------------------#
+# Show listings.
+# ----------------------------------------------------------------------------#
+# /shows browsing by date range, city and genre. A range is a preset such as
+# "weekend" or explicit from/to dates. It is read with a range scan of
+# ix_show_start_time joined to venues and artists. Every filter, the exact
+# start and end included, is in the SQL, so SHOW_LISTING_LIMIT cuts the
+# list of matching shows and never hides a match behind non-matching rows.
+# One extra row is read to tell whether the list was cut.
+#
+# Ranges with a start are listed in start time order. Ranges open at the
+# start, such as "past" and "all", are listed newest first, so a cut list
+# keeps the most recent shows.
+#
+# Results are cached per (start, end, city, genre). Presets are computed from
+# the current minute (see preset_range), so requests within a minute share an
+# entry. A new show drops the entries whose range contains its start time and
+# whose city is its venue's city, or any city, whatever their genre.
+
+SHOWS_CACHE_TTL = 300
+SHOW_LISTING_LIMIT = 500
+SHOW_PRESETS = ('upcoming', 'tonight', 'tomorrow', 'weekend', 'week', 'month', 'past', 'all')
+
+shows_cache = TTLCache(maxsize=512, ttl=SHOWS_CACHE_TTL)
+
+Listing = namedtuple('Listing', ['shows', 'truncated'])
+
+
+def _midnight(day):
+    return datetime.combine(day, time.min)
+
+
+def preset_range(preset, now):
+    # (start, end) for a preset; either end may be None for unbounded. now is
+    # cut to the minute so that a minute's requests share a cache entry.
+    now = now.replace(second=0, microsecond=0)
+    today = _midnight(now.date())
+    if preset == 'tonight':
+        return now, today + timedelta(days=1)
+    if preset == 'tomorrow':
+        return today + timedelta(days=1), today + timedelta(days=2)
+    if preset == 'weekend':
+        # Friday through Sunday; during the weekend, from now until Monday
+        friday = today + timedelta(days=4 - today.weekday())
+        return max(now, friday), friday + timedelta(days=3)
+    if preset == 'week':
+        return now, today + timedelta(days=8)
+    if preset == 'month':
+        return now, today + timedelta(days=31)
+    if preset == 'past':
+        return None, now
+    if preset == 'all':
+        return None, None
+    return now, None
+
+
+def normalize_city(city):
+    return ' '.join((city or '').lower().split())
+
+
+def _genre_pattern(genre):
+    # LIKE pattern for one genre in the ",jazz,rock n roll," form of _GENRE_LIST
+    genre = genre.strip().lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return '%,' + genre + ',%'
+
+
+# an artist's comma-separated genres as ",genre,genre,", lower case and without
+# the spaces around the commas, so one genre is a LIKE '%,genre,%' match
+_GENRE_LIST = literal(',') + func.replace(func.replace(func.lower(Artist.genres), ', ', ','), ' ,', ',') + ','
+
+SHOWS_IN_RANGE = select(Show.id, Show.venue_id, Show.artist_id, Show.start_time,
+                        Venue.name.label('venue_name'), Venue.city.label('venue_city'),
+                        Venue.state.label('venue_state'), Artist.name.label('artist_name'),
+                        Artist.image_link.label('artist_image_link'), Artist.genres.label('artist_genres')) \
+    .join(Venue, Show.venue_id == Venue.id) \
+    .join(Artist, Show.artist_id == Artist.id)
+
+
+def _load(start, end, city, genre):
+    statement = SHOWS_IN_RANGE
+    params = {'limit': SHOW_LISTING_LIMIT + 1}
+    if start is not None:
+        statement = statement.where(Show.start_time >= bindparam('start'))
+        params['start'] = start
+    if end is not None:
+        statement = statement.where(Show.start_time < bindparam('end'))
+        params['end'] = end
+    if city:
+        statement = statement.where(func.lower(Venue.city) == bindparam('city'))
+        params['city'] = city
+    if genre:
+        statement = statement.where(_GENRE_LIST.like(bindparam('genre'), escape='\\'))
+        params['genre'] = _genre_pattern(genre)
+    if start is None:
+        statement = statement.order_by(Show.start_time.desc(), Show.id.desc())
+    else:
+        statement = statement.order_by(Show.start_time, Show.id)
+    rows = db.session.execute(statement.limit(bindparam('limit')), params).all()
+    return Listing(rows[:SHOW_LISTING_LIMIT], len(rows) > SHOW_LISTING_LIMIT)
+
+
+def browse_shows(start=None, end=None, city=None, genre=None):
+    # Listing of shows with start <= start_time < end, at most SHOW_LISTING_LIMIT
+    key = (start, end, normalize_city(city), (genre or '').strip().lower())
+    listing = shows_cache.get(key)
+    if listing is None:
+        listing = _load(*key)
+        shows_cache.set(key, listing)
+    return listing
+
+
+def invalidate(start_time, city):
+    # drop the cached listings a new show at start_time in city would appear in
+    city = normalize_city(city)
+
+    def affected(key):
+        key_start, key_end, key_city, _ = key
+        return ((key_start is None or key_start <= start_time)
+                and (key_end is None or start_time < key_end)
+                and (not key_city or key_city == city))
+
+    return shows_cache.pop_matching(affected)
@@ -0,0 +1,127 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import atexit
+import json
+import logging
+import queue
+import time
+from datetime import datetime, timezone
+from logging import Formatter
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import g, request
+
+import metrics
+
+# ----------------------------------------------------------------------------#
+# Logging.
+# ----------------------------------------------------------------------------#
+# Request threads only put records on a bounded in-memory queue. A single
+# QueueListener thread formats them and writes them to size-rotated files.
+# If the disk stalls and the queue fills up, records are dropped and counted
+# rather than blocking the request.
+
+LOG_QUEUE_SIZE = 10000
+LOG_BACKUP_COUNT = 5
+
+access_logger = logging.getLogger('fyyur.access')
+
+
+class DroppingQueueHandler(QueueHandler):
+
+    dropped = 0
+
+    def prepare(self, record):
+        # keep structured access records as dicts for JsonLinesFormatter
+        if isinstance(record.msg, dict):
+            return record
+        return super().prepare(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+class JsonLinesFormatter(Formatter):
+    # access records carry their fields as a dict in record.msg
+
+    def format(self, record):
+        return json.dumps(record.msg, separators=(',', ':'), default=str)
+
+
+def _file_handler(path, max_bytes, formatter):
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=LOG_BACKUP_COUNT, delay=True)
+    handler.setFormatter(formatter)
+    return handler
+
+
+def _before_request():
+    g.access_started = time.perf_counter()
+
+
+def _after_request(response):
+    # logged when the response closes, so a streamed page's render is counted
+    started = g.pop('access_started', None)
+    if started is not None:
+        # plain values only: a closure over response would make a reference cycle
+        # and leave a streamed body to be closed whenever the GC gets to it
+        method, path, route, remote_addr = request.method, request.path, request.endpoint, request.remote_addr
+        status, length = response.status_code, response.content_length
+
+        def record():
+            queries, db_time = metrics.request_stats()
+            access_logger.info({
+                'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                'method': method,
+                'path': path,
+                'route': route,
+                'status': status,
+                'latency_ms': round((time.perf_counter() - started) * 1000, 3),
+                'queries': queries,
+                'db_ms': round(db_time * 1000, 3),
+                'bytes': length,
+                'remote_addr': remote_addr,
+            })
+
+        response.call_on_close(record)
+    return response
+
+
+def _collect_dropped():
+    yield ('fyyur_log_records_dropped_total', 'counter', 'Log records dropped because the log queue was full.',
+           [((), DroppingQueueHandler.dropped)])
+
+
+def init_app(app, error_log=None, access_log=None, max_bytes=50 * 1024 * 1024):
+    handlers = []
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+
+    if error_log:
+        error_handler = _file_handler(error_log, max_bytes, Formatter(
+            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
+        error_handler.setLevel(logging.INFO)
+        error_handler.addFilter(lambda record: record.name != access_logger.name)
+        handlers.append(error_handler)
+        app.logger.setLevel(logging.INFO)
+        app.logger.addHandler(DroppingQueueHandler(log_queue))
+
+    if access_log:
+        access_handler = _file_handler(access_log, max_bytes, JsonLinesFormatter())
+        access_handler.addFilter(lambda record: record.name == access_logger.name)
+        handlers.append(access_handler)
+        access_logger.setLevel(logging.INFO)
+        access_logger.propagate = False
+        access_logger.addHandler(DroppingQueueHandler(log_queue))
+        app.before_request(_before_request)
+        app.after_request(_after_request)
+
+    if not handlers:
+        return None
+    metrics.register_collector(_collect_dropped)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
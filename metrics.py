@@ -0,0 +1,252 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ----------------------------------------------------------------------------#
+# Metrics.
+# ----------------------------------------------------------------------------#
+# Prometheus text-format metrics, aggregated per thread. Recording a value
+# only touches dicts owned by the current thread, so there is no lock on the
+# request path. A scrape walks every thread's store and merges them.
+#
+# Servers that start a thread per request would leave one store behind per
+# request. So whenever a thread registers its store, and on every scrape,
+# the stores of threads that have finished are folded into one process-wide
+# total and dropped. A finished thread records nothing more, so folding its
+# store needs no coordination with it.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+METRICS = {
+    'fyyur_request_duration_seconds': ('histogram', 'Request latency by endpoint.', LATENCY_BUCKETS),
+    'fyyur_requests_total': ('counter', 'Requests by endpoint and status.', None),
+    'fyyur_template_render_seconds': ('histogram', 'Template render time.', LATENCY_BUCKETS),
+    'fyyur_db_query_seconds': ('histogram', 'Time spent in a single DB statement.', LATENCY_BUCKETS),
+    'fyyur_request_db_seconds': ('histogram', 'DB time per request by endpoint.', LATENCY_BUCKETS),
+    'fyyur_request_db_queries': ('histogram', 'DB statements per request by endpoint.', COUNT_BUCKETS),
+    'fyyur_tasks_total': ('counter', 'Background task attempts by task and outcome.', None),
+    'fyyur_tasks_inline_total': ('counter', 'Background tasks run inline because the queue was full.', None),
+    'fyyur_requests_rejected_total': ('counter', 'Requests refused by rate limiting or load shedding.', None),
+}
+
+# (thread, store) for every live thread that has recorded something
+_stores = []
+_stores_lock = threading.Lock()
+_local = threading.local()
+_collectors = []
+_caches = {}
+
+
+class _Store:
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+
+    def merge(self, other):
+        # dict.copy() is atomic, so a thread recording mid-merge is harmless
+        for key, item in other.histograms.copy().items():
+            merged = self.histograms.setdefault(key, [0] * len(item))
+            for i, value in enumerate(list(item)):
+                merged[i] += value
+        for key, value in other.counters.copy().items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+_total = _Store()
+
+
+def _prune():
+    # caller holds _stores_lock; fold the stores of finished threads into _total
+    live = []
+    for thread, store in _stores:
+        if thread.is_alive():
+            live.append((thread, store))
+        else:
+            _total.merge(store)
+    _stores[:] = live
+
+
+def _store():
+    store = getattr(_local, 'store', None)
+    if store is None:
+        store = _local.store = _Store()
+        with _stores_lock:
+            _prune()
+            _stores.append((threading.current_thread(), store))
+    return store
+
+
+def observe(name, value, labels=()):
+    histograms = _store().histograms
+    key = (name, labels)
+    item = histograms.get(key)
+    if item is None:
+        # one slot per bucket, one for +Inf, then the running sum
+        item = histograms[key] = [0] * (len(METRICS[name][2]) + 2)
+    item[bisect_left(METRICS[name][2], value)] += 1
+    item[-1] += value
+
+
+def inc(name, value=1, labels=()):
+    counters = _store().counters
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+
+def register_collector(collector):
+    # collector() yields (name, type, help, [(labels, value), ...]) at scrape time
+    _collectors.append(collector)
+
+
+def register_cache(name, cache):
+    # anything with hits, misses and __len__, such as cache.TTLCache
+    if not _caches:
+        register_collector(_collect_caches)
+    _caches[name] = cache
+
+
+def _collect_caches():
+    caches = sorted(_caches.items())
+    yield ('fyyur_cache_hits_total', 'counter', 'Cache hits.',
+           [((('cache', name),), cache.hits) for name, cache in caches])
+    yield ('fyyur_cache_misses_total', 'counter', 'Cache misses.',
+           [((('cache', name),), cache.misses) for name, cache in caches])
+    yield ('fyyur_cache_entries', 'gauge', 'Entries currently cached.',
+           [((('cache', name),), len(cache)) for name, cache in caches])
+
+
+# ----------------------------------------------------------------------------#
+# Per-request bookkeeping.
+# ----------------------------------------------------------------------------#
+
+def request_stats():
+    # (query count, DB seconds) for the request running on this thread
+    return getattr(_local, 'queries', 0), getattr(_local, 'db_time', 0.0)
+
+
+def _before_request():
+    _local.queries = 0
+    _local.db_time = 0.0
+    g.metrics_started = time.perf_counter()
+
+
+def _after_request(response):
+    # A streamed page renders while its body is sent, after this hook, so the
+    # request is timed up to the moment the server closes the response.
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        endpoint = (('endpoint', request.endpoint or 'unmatched'),)
+        status = str(response.status_code)
+
+        def record():
+            queries, db_time = request_stats()
+            observe('fyyur_request_duration_seconds', time.perf_counter() - started, endpoint)
+            observe('fyyur_request_db_seconds', db_time, endpoint)
+            observe('fyyur_request_db_queries', queries, endpoint)
+            inc('fyyur_requests_total', labels=endpoint + (('status', status),))
+
+        response.call_on_close(record)
+    return response
+
+
+def _before_render(sender, template, context, **extra):
+    _local.render_started = time.perf_counter()
+
+
+def _rendered(sender, template, context, **extra):
+    started = getattr(_local, 'render_started', None)
+    if started is not None:
+        observe('fyyur_template_render_seconds', time.perf_counter() - started,
+                (('template', template.name or 'string'),))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started
+    observe('fyyur_db_query_seconds', elapsed)
+    _local.queries = getattr(_local, 'queries', 0) + 1
+    _local.db_time = getattr(_local, 'db_time', 0.0) + elapsed
+
+
+def init_app(app, db):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def collect_pool():
+        pool = db.engine.pool
+        samples = []
+        for stat in ('size', 'checkedout', 'checkedin', 'overflow'):
+            if hasattr(pool, stat):
+                samples.append(((('state', stat),), getattr(pool, stat)()))
+        yield ('fyyur_db_pool_connections', 'gauge', 'Connection pool utilization.', samples)
+    register_collector(collect_pool)
+
+
+# ----------------------------------------------------------------------------#
+# Exposition.
+# ----------------------------------------------------------------------------#
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for key, value in labels) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    merged = _Store()
+    with _stores_lock:
+        _prune()
+        merged.merge(_total)
+        stores = [store for _, store in _stores]
+    for store in stores:
+        merged.merge(store)
+    histograms, counters = merged.histograms, merged.counters
+
+    lines = []
+    for name, (kind, help, buckets) in METRICS.items():
+        lines.append('# HELP %s %s' % (name, help))
+        lines.append('# TYPE %s %s' % (name, kind))
+        if kind == 'histogram':
+            for (metric, labels), item in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), item[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _format_value(float(bound))
+                    lines.append('%s_bucket%s %d' % (name, _format_labels(labels + (('le', le),)), cumulative))
+                lines.append('%s_sum%s %s' % (name, _format_labels(labels), _format_value(item[-1])))
+                lines.append('%s_count%s %d' % (name, _format_labels(labels), cumulative))
+        else:
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append('%s%s %s' % (name, _format_labels(labels), _format_value(value)))
+
+    for collector in _collectors:
+        for name, kind, help, samples in collector():
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for labels, value in samples:
+                lines.append('%s%s %s' % (name, _format_labels(labels), _format_value(value)))
+    return '\n'.join(lines) + '\n'
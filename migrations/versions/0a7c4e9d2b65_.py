@@ -0,0 +1,34 @@
+"""add name and blocking keys to venues and artists for duplicate detection
+
+Revision ID: 0a7c4e9d2b65
+Revises: f6a3d8e2b917
+Create Date: 2026-10-18 18:14:46.330518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0a7c4e9d2b65'
+down_revision = 'f6a3d8e2b917'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('name_key', sa.String(), nullable=True))
+    op.add_column('Venue', sa.Column('block_key', sa.String(length=8), nullable=True))
+    op.create_index('ix_venue_block_key_state', 'Venue', ['block_key', 'state'], unique=False)
+    op.add_column('Artist', sa.Column('name_key', sa.String(), nullable=True))
+    op.add_column('Artist', sa.Column('block_key', sa.String(length=8), nullable=True))
+    op.create_index('ix_artist_block_key_state', 'Artist', ['block_key', 'state'], unique=False)
+    # existing rows get their keys from `flask dedupe`
+
+
+def downgrade():
+    op.drop_index('ix_artist_block_key_state', table_name='Artist')
+    op.drop_column('Artist', 'block_key')
+    op.drop_column('Artist', 'name_key')
+    op.drop_index('ix_venue_block_key_state', table_name='Venue')
+    op.drop_column('Venue', 'block_key')
+    op.drop_column('Venue', 'name_key')
@@ -0,0 +1,25 @@
+"""add changed_at to venues and artists for calendar feed Last-Modified
+
+Revision ID: 3b8d1f6c0e42
+Revises: 0a7c4e9d2b65
+Create Date: 2026-10-19 09:12:05.418377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3b8d1f6c0e42'
+down_revision = '0a7c4e9d2b65'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('changed_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+    op.add_column('Artist', sa.Column('changed_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade():
+    op.drop_column('Artist', 'changed_at')
+    op.drop_column('Venue', 'changed_at')
@@ -0,0 +1,24 @@
+"""index shows by venue and artist start time
+
+Revision ID: 3f9a1c2d4b7e
+Revises: 71c77822e252
+Create Date: 2026-10-18 10:12:41.302118
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c2d4b7e'
+down_revision = '71c77822e252'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='Show')
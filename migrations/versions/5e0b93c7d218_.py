@@ -0,0 +1,57 @@
+"""add show rollups for booking analytics
+
+Revision ID: 5e0b93c7d218
+Revises: c41d7e9a2f05
+Create Date: 2026-10-18 13:05:09.640217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5e0b93c7d218'
+down_revision = 'c41d7e9a2f05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('VenueDailyRollup',
+                    sa.Column('venue_id', sa.Integer(), nullable=False),
+                    sa.Column('day', sa.Date(), nullable=False),
+                    sa.Column('show_count', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('venue_id', 'day')
+                    )
+    op.create_table('ArtistDailyRollup',
+                    sa.Column('artist_id', sa.Integer(), nullable=False),
+                    sa.Column('day', sa.Date(), nullable=False),
+                    sa.Column('show_count', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('artist_id', 'day')
+                    )
+    op.create_table('VenueArtistRollup',
+                    sa.Column('venue_id', sa.Integer(), nullable=False),
+                    sa.Column('artist_id', sa.Integer(), nullable=False),
+                    sa.Column('show_count', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+                    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('venue_id', 'artist_id')
+                    )
+    # backfill from existing shows; later changes are applied by the app
+    op.execute("""
+        INSERT INTO "VenueDailyRollup" (venue_id, day, show_count)
+        SELECT venue_id, CAST(start_time AS DATE), COUNT(*) FROM "Show" GROUP BY venue_id, CAST(start_time AS DATE);
+
+        INSERT INTO "ArtistDailyRollup" (artist_id, day, show_count)
+        SELECT artist_id, CAST(start_time AS DATE), COUNT(*) FROM "Show" GROUP BY artist_id, CAST(start_time AS DATE);
+
+        INSERT INTO "VenueArtistRollup" (venue_id, artist_id, show_count)
+        SELECT venue_id, artist_id, COUNT(*) FROM "Show" GROUP BY venue_id, artist_id;
+    """)
+
+
+def downgrade():
+    op.drop_table('VenueArtistRollup')
+    op.drop_table('ArtistDailyRollup')
+    op.drop_table('VenueDailyRollup')
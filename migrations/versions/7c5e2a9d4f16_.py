@@ -0,0 +1,26 @@
+"""index artists by initial letter for the directory pages
+
+Revision ID: 7c5e2a9d4f16
+Revises: 3b8d1f6c0e42
+Create Date: 2026-10-19 09:47:31.260914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '7c5e2a9d4f16'
+down_revision = '3b8d1f6c0e42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_artist_initial_lower_name_id', 'Artist',
+                    [sa.text('substr(lower(name), 1, 1)'), sa.text('lower(name)'), 'id'], unique=False)
+    op.drop_index('ix_artist_lower_name_id', table_name='Artist')
+
+
+def downgrade():
+    op.create_index('ix_artist_lower_name_id', 'Artist', [sa.text('lower(name)'), 'id'], unique=False)
+    op.drop_index('ix_artist_initial_lower_name_id', table_name='Artist')
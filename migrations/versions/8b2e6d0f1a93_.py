@@ -0,0 +1,23 @@
+"""index artists by lower(name), id for the directory
+
+Revision ID: 8b2e6d0f1a93
+Revises: 3f9a1c2d4b7e
+Create Date: 2026-10-18 11:02:17.554091
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8b2e6d0f1a93'
+down_revision = '3f9a1c2d4b7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_artist_lower_name_id', 'Artist', [sa.text('lower(name)'), 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_artist_lower_name_id', table_name='Artist')
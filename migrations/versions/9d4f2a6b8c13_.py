@@ -0,0 +1,25 @@
+"""add a version counter to venues and artists for optimistic concurrency
+
+Revision ID: 9d4f2a6b8c13
+Revises: 5e0b93c7d218
+Create Date: 2026-10-18 15:40:09.218734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9d4f2a6b8c13'
+down_revision = '5e0b93c7d218'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('Artist', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('Artist', 'version')
+    op.drop_column('Venue', 'version')
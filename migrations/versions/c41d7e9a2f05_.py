@@ -0,0 +1,30 @@
+"""add precomputed recommendations
+
+Revision ID: c41d7e9a2f05
+Revises: 8b2e6d0f1a93
+Create Date: 2026-10-18 12:20:45.118734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7e9a2f05'
+down_revision = '8b2e6d0f1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Recommendation',
+                    sa.Column('kind', sa.String(length=16), nullable=False),
+                    sa.Column('source_id', sa.Integer(), nullable=False),
+                    sa.Column('rank', sa.Integer(), nullable=False),
+                    sa.Column('target_id', sa.Integer(), nullable=False),
+                    sa.Column('score', sa.Float(), nullable=False),
+                    sa.PrimaryKeyConstraint('kind', 'source_id', 'rank')
+                    )
+
+
+def downgrade():
+    op.drop_table('Recommendation')
@@ -0,0 +1,25 @@
+"""add recommendations_generation to venues and artists for ordered refreshes
+
+Revision ID: c9a4e1b7d350
+Revises: 7c5e2a9d4f16
+Create Date: 2026-10-19 10:21:48.903127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c9a4e1b7d350'
+down_revision = '7c5e2a9d4f16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('recommendations_generation', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Artist', sa.Column('recommendations_generation', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('Artist', 'recommendations_generation')
+    op.drop_column('Venue', 'recommendations_generation')
@@ -0,0 +1,30 @@
+"""add venue coordinates and a grid cell index for nearby search
+
+Revision ID: e27c5b1f8a40
+Revises: 9d4f2a6b8c13
+Create Date: 2026-10-18 16:22:51.904316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e27c5b1f8a40'
+down_revision = '9d4f2a6b8c13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('grid_cell', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_Venue_grid_cell'), 'Venue', ['grid_cell'], unique=False)
+    # existing rows are located with `flask geocode-venues`
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Venue_grid_cell'), table_name='Venue')
+    op.drop_column('Venue', 'grid_cell')
+    op.drop_column('Venue', 'longitude')
+    op.drop_column('Venue', 'latitude')
@@ -0,0 +1,32 @@
+"""add Deletion table for chunked delete status
+
+Revision ID: e5d2b8a1c694
+Revises: c9a4e1b7d350
+Create Date: 2026-10-19 11:02:57.614820
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e5d2b8a1c694'
+down_revision = 'c9a4e1b7d350'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Deletion',
+                    sa.Column('kind', sa.String(length=16), nullable=False),
+                    sa.Column('entity_id', sa.Integer(), nullable=False),
+                    sa.Column('state', sa.String(length=16), nullable=False),
+                    sa.Column('shows_total', sa.Integer(), nullable=True),
+                    sa.Column('shows_deleted', sa.Integer(), nullable=False),
+                    sa.Column('error', sa.String(), nullable=True),
+                    sa.Column('updated_at', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('kind', 'entity_id')
+                    )
+
+
+def downgrade():
+    op.drop_table('Deletion')
@@ -0,0 +1,23 @@
+"""index shows by start_time for date-range listings
+
+Revision ID: f6a3d8e2b917
+Revises: e27c5b1f8a40
+Create Date: 2026-10-18 17:08:33.471862
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f6a3d8e2b917'
+down_revision = 'e27c5b1f8a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_start_time', 'Show', ['start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_start_time', table_name='Show')
@@ -28,8 +28,25 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, nullable=True, default=False)
     seeking_description = db.Column(db.String, nullable=True, default="We are currently searching for local artists "
                                                                       "to play shows.")
+    # bumped by every edit; see edits.py
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # last change that shows in a calendar feed; see calendar_feed.py
+    changed_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+    # bumped by every write of its recommendations; see recommendations.py
+    recommendations_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # city centroid and its grid cell; see geo.py
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    grid_cell = db.Column(db.Integer, index=True)
+    # normalized name and its prefix, for duplicate checks; see dedupe.py
+    name_key = db.Column(db.String)
+    block_key = db.Column(db.String(8))
     shows = db.relationship('Show', backref='venue', cascade="all, delete", lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_venue_block_key_state', block_key, state),
+    )
+
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
@@ -46,13 +63,78 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, nullable=True, default=False)
     seeking_description = db.Column(db.String, nullable=True, default="I am currently searching for venues "
                                                                       "to play shows.")
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    changed_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+    recommendations_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    name_key = db.Column(db.String)
+    block_key = db.Column(db.String(8))
     shows = db.relationship('Show', backref='artist', cascade="all, delete", lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_artist_initial_lower_name_id', db.func.substr(db.func.lower(name), 1, 1), db.func.lower(name), id),
+        db.Index('ix_artist_block_key_state', block_key, state),
+    )
+
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_show_start_time', 'start_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.ForeignKey('Venue.id', ondelete="CASCADE"), nullable=False)
     artist_id = db.Column(db.ForeignKey('Artist.id', ondelete="CASCADE"), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+
+
+class Recommendation(db.Model):
+    # precomputed top-k "similar artists" / "venues like this", see recommendations.py
+    __tablename__ = 'Recommendation'
+
+    kind = db.Column(db.String(16), primary_key=True)
+    source_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    target_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+
+# Show rollups, kept current by rollups.py and read by the analytics pages
+
+class VenueDailyRollup(db.Model):
+    __tablename__ = 'VenueDailyRollup'
+
+    venue_id = db.Column(db.ForeignKey('Venue.id', ondelete="CASCADE"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    show_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ArtistDailyRollup(db.Model):
+    __tablename__ = 'ArtistDailyRollup'
+
+    artist_id = db.Column(db.ForeignKey('Artist.id', ondelete="CASCADE"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    show_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class VenueArtistRollup(db.Model):
+    __tablename__ = 'VenueArtistRollup'
+
+    venue_id = db.Column(db.ForeignKey('Venue.id', ondelete="CASCADE"), primary_key=True)
+    artist_id = db.Column(db.ForeignKey('Artist.id', ondelete="CASCADE"), primary_key=True)
+    show_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Deletion(db.Model):
+    # progress of a chunked venue or artist delete, see deletes.py; outlives the row it deletes
+    __tablename__ = 'Deletion'
+
+    kind = db.Column(db.String(16), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    state = db.Column(db.String(16), nullable=False)
+    shows_total = db.Column(db.Integer)
+    shows_deleted = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String)
+    updated_at = db.Column(db.DateTime, nullable=False)
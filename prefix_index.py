@@ -0,0 +1,157 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+
+# ----------------------------------------------------------------------------#
+# Prefix index.
+# ----------------------------------------------------------------------------#
+# Per-process, in-memory index used by the typeahead endpoints. Every word of a
+# name is stored as a (key, item_id) entry in one sorted list, so a lookup is a
+# bisect to the first key >= prefix followed by a short forward scan.
+# "Mus" therefore finds "The Musical Hop" as well as "Music Box".
+#
+# The index is rebuilt from the loader every INDEX_TTL seconds, so creates,
+# renames and deletes made by other worker processes show up here too; this
+# process's own changes are applied at once through add() and remove(). A
+# build streams every name, so it runs outside the lock: the request that
+# starts it pays for it, other lookups keep using the previous list (or get
+# no results before the first build finishes), and the changes made while
+# it ran are replayed onto the new list when it is swapped in.
+#
+# add() inserts into that flat list, which moves every later entry: O(n) per
+# create in the number of indexed words. At tens of thousands of names that is
+# well under a millisecond, and creates are rare next to lookups, so the
+# simpler structure wins; a sorted-containers or trie index is the upgrade if
+# writes ever dominate.
+
+INDEX_TTL = 300
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    return ' '.join(_WORD_RE.findall((text or '').lower()))
+
+
+def _keys(name):
+    words = normalize(name).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class PrefixIndex:
+
+    def __init__(self, loader, ttl=INDEX_TTL):
+        # loader() returns an iterable of (id, name) rows; called lazily and every ttl seconds
+        self._loader = loader
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = None
+        self._names = {}
+        self._loaded_at = 0.0
+        # add() and remove() calls made while a build runs, or None when none is running
+        self._changes = None
+
+    @property
+    def loaded(self):
+        return self._entries is not None
+
+    def _claim_build(self):
+        # caller holds the lock; True if the caller should build now
+        if self._changes is not None:
+            return False
+        if self._entries is not None and time.monotonic() - self._loaded_at <= self._ttl:
+            return False
+        self._changes = []
+        return True
+
+    def _build(self):
+        try:
+            names = {}
+            entries = []
+            for item_id, name in self._loader():
+                names[item_id] = name
+                entries.extend((key, item_id) for key in _keys(name))
+            entries.sort()
+        except Exception:
+            with self._lock:
+                self._changes = None
+            raise
+        with self._lock:
+            changes = self._changes
+            self._names = names
+            self._entries = entries
+            self._changes = None
+            self._loaded_at = time.monotonic()
+            # the load may or may not have seen these; both are idempotent
+            for item_id, name in changes:
+                if name is None:
+                    self._remove(item_id)
+                else:
+                    self._add(item_id, name)
+
+    def search(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            build = self._claim_build()
+        if build:
+            self._build()
+        results = []
+        seen = set()
+        with self._lock:
+            entries = self._entries
+            if entries is None:
+                # the first build is still running in another request
+                return []
+            i = bisect_left(entries, (prefix,))
+            while i < len(entries) and len(results) < limit:
+                key, item_id = entries[i]
+                if not key.startswith(prefix):
+                    break
+                if item_id not in seen:
+                    seen.add(item_id)
+                    results.append({'id': item_id, 'name': self._names[item_id]})
+                i += 1
+        return results
+
+    def add(self, item_id, name):
+        # Before the first lookup the index is not built yet and the lazy load
+        # will read the new row, so there is nothing to do.
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((item_id, name))
+            if self._entries is not None:
+                self._add(item_id, name)
+
+    def remove(self, item_id):
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((item_id, None))
+            if self._entries is not None:
+                self._remove(item_id)
+
+    def _add(self, item_id, name):
+        self._remove(item_id)
+        self._names[item_id] = name
+        for key in _keys(name):
+            insort(self._entries, (key, item_id))
+
+    def _remove(self, item_id):
+        name = self._names.pop(item_id, None)
+        if name is None:
+            return
+        for key in _keys(name):
+            i = bisect_left(self._entries, (key, item_id))
+            if i < len(self._entries) and self._entries[i] == (key, item_id):
+                del self._entries[i]
+
+    def clear(self):
+        with self._lock:
+            self._entries = None
+            self._names = {}
@@ -0,0 +1,145 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from itsdangerous import BadSignature, TimestampSigner
+from werkzeug.exceptions import HTTPException
+
+# ----------------------------------------------------------------------------#
+# Profiling middleware.
+# ----------------------------------------------------------------------------#
+# Opt-in WSGI middleware that runs cProfile on a random sample of requests,
+# or on any request carrying a valid signed X-Profile header. Each profile is
+# written as a .prof (pstats) file under <directory>/<endpoint>/. You can open
+# it with pstats, snakeviz, or flameprof for a flamegraph. Old files are
+# pruned so that each endpoint keeps at most max_files_per_route and the
+# directory stays under max_bytes.
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_TOKEN_MAX_AGE = 3600
+PROFILE_SALT = 'fyyur-profile'
+
+logger = logging.getLogger(__name__)
+
+
+def make_token(secret):
+    return TimestampSigner(secret, salt=PROFILE_SALT).sign(b'profile').decode('ascii')
+
+
+class ProfilingMiddleware:
+
+    def __init__(self, wsgi_app, url_map, directory, sample_rate=0.0, secret=None,
+                 max_files_per_route=20, max_bytes=100 * 1024 * 1024):
+        self.wsgi_app = wsgi_app
+        self.url_map = url_map
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.signer = TimestampSigner(secret, salt=PROFILE_SALT) if secret else None
+        self.max_files_per_route = max_files_per_route
+        self.max_bytes = max_bytes
+        self._prune_lock = threading.Lock()
+
+    def _wanted(self, environ):
+        token = environ.get(PROFILE_HEADER)
+        if token and self.signer is not None:
+            try:
+                self.signer.unsign(token, max_age=PROFILE_TOKEN_MAX_AGE)
+                return True
+            except BadSignature:
+                pass
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _endpoint(self, environ):
+        try:
+            endpoint, _ = self.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            endpoint = 'unmatched'
+        return re.sub(r'[^\w.-]', '_', endpoint)
+
+    def __call__(self, environ, start_response):
+        if not self._wanted(environ):
+            return self.wsgi_app(environ, start_response)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another request on this interpreter is already being profiled
+            return self.wsgi_app(environ, start_response)
+        started = time.time()
+        try:
+            body = self.wsgi_app(environ, start_response)
+        finally:
+            profile.disable()
+        return _ProfiledBody(body, profile, lambda: self._save(profile, environ, started))
+
+    def _save(self, profile, environ, started):
+        try:
+            self._write(profile, environ, started)
+        except OSError as err:
+            # a full or unwritable disk must never fail the request itself
+            logger.warning('could not write profile: %s', err)
+
+    def _write(self, profile, environ, started):
+        route_dir = os.path.join(self.directory, self._endpoint(environ))
+        os.makedirs(route_dir, exist_ok=True)
+        filename = '%s.%06d-%s-%.0fms.prof' % (time.strftime('%Y%m%dT%H%M%S', time.gmtime(started)),
+                                               (started % 1) * 1000000, environ.get('REQUEST_METHOD', 'GET'),
+                                               (time.time() - started) * 1000)
+        profile.dump_stats(os.path.join(route_dir, filename))
+        with self._prune_lock:
+            self._prune(route_dir)
+
+    def _prune(self, route_dir):
+        route_files = sorted(os.scandir(route_dir), key=lambda entry: entry.stat().st_mtime)
+        for entry in route_files[:-self.max_files_per_route]:
+            os.remove(entry.path)
+        files = []
+        for sub in os.scandir(self.directory):
+            if sub.is_dir():
+                files.extend(entry for entry in os.scandir(sub.path) if entry.is_file())
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in files)
+        for entry in files:
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+
+
+class _ProfiledBody:
+    # Keeps the profiler running while a streamed body is iterated and writes
+    # the profile once the server closes the response.
+
+    def __init__(self, body, profile, save):
+        self.body = body
+        self.profile = profile
+        self.save = save
+
+    def __iter__(self):
+        iterator = iter(self.body)
+        while True:
+            try:
+                self.profile.enable()
+            except ValueError:
+                pass
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.profile.disable()
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.save()
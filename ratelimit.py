@@ -0,0 +1,158 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
+import metrics
+
+# ----------------------------------------------------------------------------#
+# Rate limiting and admission control.
+# ----------------------------------------------------------------------------#
+# Two checks run before an expensive view touches the database:
+#
+# * a token bucket per (endpoint, client). Each bucket holds up to `burst`
+#   tokens and refills at `rate` tokens per second. A request spends one
+#   token, or gets a 429 with Retry-After set to when the next token is due.
+# * a process-wide cap on expensive requests in flight. When every slot is
+#   taken the request is shed at once with a 503, rather than waiting on
+#   the connection pool and piling up behind the queries already running.
+#
+# Buckets live in memory by default, so each worker process limits on its
+# own. Set RATE_LIMIT_STORAGE_URL to a Redis URL to share them between
+# processes and hosts.
+
+MEMORY_STORE_MAX_KEYS = 100000
+SHED_RETRY_AFTER = 1
+
+
+class MemoryStore:
+    # LRU-bounded; an evicted bucket has been idle longest and would be
+    # close to full anyway
+
+    def __init__(self, max_keys=MEMORY_STORE_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        # (allowed, seconds until the next token if not)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = burst
+                if len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+class RedisStore:
+    # The bucket update runs as one Lua script, so concurrent workers cannot
+    # both spend the last token. Keys expire once a bucket would be full again.
+
+    SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = burst
+if bucket[1] then
+  tokens = math.min(burst, tonumber(bucket[1]) + (now - tonumber(bucket[2])) * rate)
+end
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+    def __init__(self, client, prefix='fyyur:ratelimit:'):
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst):
+        allowed, tokens = self._script(keys=[self.prefix + key], args=[rate, burst])
+        return bool(allowed), 0 if allowed else (1 - float(tokens)) / rate
+
+
+_store = MemoryStore()
+_slots = None
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def client_id():
+    # remote_addr is the peer address; wrap the app in ProxyFix when it runs
+    # behind a trusted proxy so this becomes the real client
+    return request.remote_addr or 'unknown'
+
+
+def _reject(error, reason, retry_after):
+    metrics.inc('fyyur_requests_rejected_total',
+                labels=(('endpoint', request.endpoint), ('reason', reason)))
+    raise error(retry_after=max(1, math.ceil(retry_after)))
+
+
+def limit(rate, burst, expensive=False):
+    # Decorate a view with a per-client token bucket of `burst` requests,
+    # refilled at `rate` per second. expensive=True also counts the request
+    # against the shared in-flight cap.
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            global _in_flight
+            if rate:
+                allowed, retry_after = _store.take('%s:%s' % (request.endpoint, client_id()), rate, burst)
+                if not allowed:
+                    _reject(TooManyRequests, 'rate', retry_after)
+            if not expensive or _slots is None:
+                return view(*args, **kwargs)
+            if not _slots.acquire(blocking=False):
+                _reject(ServiceUnavailable, 'concurrency', SHED_RETRY_AFTER)
+            with _in_flight_lock:
+                _in_flight += 1
+            try:
+                return view(*args, **kwargs)
+            finally:
+                with _in_flight_lock:
+                    _in_flight -= 1
+                _slots.release()
+        return wrapped
+    return decorator
+
+
+def _collect_in_flight():
+    yield ('fyyur_expensive_requests_in_flight', 'gauge', 'Expensive requests currently admitted.',
+           [((), _in_flight)])
+
+
+def init_app(app, store=None):
+    # store: anything with take(key, rate, burst) -> (allowed, retry_after)
+    global _store, _slots
+    url = app.config.get('RATE_LIMIT_STORAGE_URL')
+    if store is not None:
+        _store = store
+    elif url:
+        import redis
+        _store = RedisStore(redis.Redis.from_url(url))
+    max_concurrent = app.config.get('EXPENSIVE_MAX_CONCURRENT')
+    _slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+    metrics.register_collector(_collect_in_flight)
@@ -0,0 +1,207 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+from dataclasses import dataclass
+from itertools import groupby
+
+from sqlalchemy import and_, bindparam, func, select
+
+from models import Venue, Show, Artist, Recommendation, db
+
+# ----------------------------------------------------------------------------#
+# Read-only data access.
+# ----------------------------------------------------------------------------#
+# Read pages only display data, so they select plain columns with Core and
+# never load ORM entities. Nothing passes through the identity map or change
+# tracking, and there are no half-mutated objects left in the session for a
+# later commit to flush.
+#
+# Statements used on every request are built once at import time, with
+# bound parameters for the ids. Because they are Core constructs and not SQL
+# strings, SQLAlchemy reuses the compiled form from its statement cache and
+# renders the dialect-specific SQL for now() and ILIKE itself.
+
+VENUE_COLUMNS = (Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.phone, Venue.genres,
+                 Venue.image_link, Venue.facebook_link, Venue.website_link, Venue.seeking_talent,
+                 Venue.seeking_description, Venue.version)
+
+ARTIST_COLUMNS = (Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone, Artist.genres,
+                  Artist.image_link, Artist.facebook_link, Artist.website_link, Artist.seeking_venue,
+                  Artist.seeking_description, Artist.version)
+
+
+@dataclass
+class VenueDetail:
+    __slots__ = ('id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link', 'facebook_link',
+                 'website_link', 'seeking_talent', 'seeking_description', 'past_shows', 'upcoming_shows',
+                 'similar_venues')
+    id: int
+    name: str
+    city: str
+    state: str
+    address: str
+    phone: str
+    genres: list
+    image_link: str
+    facebook_link: str
+    website_link: str
+    seeking_talent: bool
+    seeking_description: str
+    past_shows: list
+    upcoming_shows: list
+    similar_venues: list
+
+    @property
+    def past_shows_count(self):
+        return len(self.past_shows)
+
+    @property
+    def upcoming_shows_count(self):
+        return len(self.upcoming_shows)
+
+
+@dataclass
+class ArtistDetail:
+    __slots__ = ('id', 'name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link',
+                 'website_link', 'seeking_venue', 'seeking_description', 'past_shows', 'upcoming_shows',
+                 'similar_artists')
+    id: int
+    name: str
+    city: str
+    state: str
+    phone: str
+    genres: list
+    image_link: str
+    facebook_link: str
+    website_link: str
+    seeking_venue: bool
+    seeking_description: str
+    past_shows: list
+    upcoming_shows: list
+    similar_artists: list
+
+    @property
+    def past_shows_count(self):
+        return len(self.past_shows)
+
+    @property
+    def upcoming_shows_count(self):
+        return len(self.upcoming_shows)
+
+
+def to_genres_list(genres):
+    return [genre.strip() for genre in genres.split(",")] if genres else []
+
+
+def _split_shows(rows):
+    # one query for both lists; the upcoming flag is evaluated by the database
+    past_shows = []
+    upcoming_shows = []
+    for row in rows:
+        (upcoming_shows if row.upcoming else past_shows).append(row)
+    return past_shows, upcoming_shows
+
+
+def _recommended_statement(model):
+    # precomputed top-k list; one range scan of the Recommendation primary key
+    return select(model.id, model.name, model.image_link) \
+        .join(Recommendation, Recommendation.target_id == model.id) \
+        .where(Recommendation.kind == bindparam('kind'), Recommendation.source_id == bindparam('source_id')) \
+        .order_by(Recommendation.rank)
+
+
+RECOMMENDED = {'venue': _recommended_statement(Venue), 'artist': _recommended_statement(Artist)}
+
+VENUE = select(*VENUE_COLUMNS).where(Venue.id == bindparam('venue_id'))
+
+ARTIST = select(*ARTIST_COLUMNS).where(Artist.id == bindparam('artist_id'))
+
+VENUE_SHOWS = select(Show.id, Show.start_time, Show.artist_id, Show.venue_id,
+                     Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+                     (Show.start_time > func.now()).label('upcoming')) \
+    .join(Artist, Show.artist_id == Artist.id) \
+    .where(Show.venue_id == bindparam('venue_id')) \
+    .order_by(Show.start_time)
+
+ARTIST_SHOWS = select(Show.id, Show.start_time, Show.artist_id, Show.venue_id,
+                      Venue.name.label('venue_name'), Venue.image_link.label('venue_image_link'),
+                      (Show.start_time > func.now()).label('upcoming')) \
+    .join(Venue, Show.venue_id == Venue.id) \
+    .where(Show.artist_id == bindparam('artist_id')) \
+    .order_by(Show.start_time)
+
+
+def _recommended(kind, source_id):
+    return db.session.execute(RECOMMENDED[kind], {'kind': kind, 'source_id': source_id}).all()
+
+
+def get_venue(venue_id):
+    # Core row with the editable venue columns, or None
+    return db.session.execute(VENUE, {'venue_id': venue_id}).first()
+
+
+def get_artist(artist_id):
+    return db.session.execute(ARTIST, {'artist_id': artist_id}).first()
+
+
+def get_venue_detail(venue_id):
+    row = get_venue(venue_id)
+    if row is None:
+        return None
+    shows = db.session.execute(VENUE_SHOWS, {'venue_id': venue_id}).all()
+    past_shows, upcoming_shows = _split_shows(shows)
+    return VenueDetail(
+        id=row.id,
+        name=row.name,
+        city=row.city,
+        state=row.state,
+        address=row.address,
+        phone=row.phone,
+        genres=to_genres_list(row.genres),
+        image_link=row.image_link,
+        facebook_link=row.facebook_link,
+        website_link=row.website_link,
+        seeking_talent=row.seeking_talent,
+        seeking_description=row.seeking_description,
+        past_shows=past_shows,
+        upcoming_shows=upcoming_shows,
+        similar_venues=_recommended('venue', venue_id),
+    )
+
+
+def get_artist_detail(artist_id):
+    row = get_artist(artist_id)
+    if row is None:
+        return None
+    shows = db.session.execute(ARTIST_SHOWS, {'artist_id': artist_id}).all()
+    past_shows, upcoming_shows = _split_shows(shows)
+    return ArtistDetail(
+        id=row.id,
+        name=row.name,
+        city=row.city,
+        state=row.state,
+        phone=row.phone,
+        genres=to_genres_list(row.genres),
+        image_link=row.image_link,
+        facebook_link=row.facebook_link,
+        website_link=row.website_link,
+        seeking_venue=row.seeking_venue,
+        seeking_description=row.seeking_description,
+        past_shows=past_shows,
+        upcoming_shows=upcoming_shows,
+        similar_artists=_recommended('artist', artist_id),
+    )
+
+
+VENUES_WITH_UPCOMING = select(Venue.id, Venue.name, Venue.city, Venue.state,
+                              func.count(Show.id).label('num_upcoming_shows')) \
+    .outerjoin(Show, and_(Venue.id == Show.venue_id, Show.start_time > func.now())) \
+    .group_by(Venue.id) \
+    .order_by(Venue.state, Venue.city, Venue.name, Venue.id)
+
+
+def venues_by_area():
+    # one pass over venues ordered by (state, city), grouped into areas
+    rows = db.session.execute(VENUES_WITH_UPCOMING).all()
+    return [{'city': city, 'state': state, 'venues': list(venues)}
+            for (state, city), venues in groupby(rows, key=lambda row: (row.state, row.city))]
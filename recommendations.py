@@ -0,0 +1,281 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import numpy as np
+from scipy import sparse
+from sqlalchemy import and_, delete, func, select, update
+
+from models import Venue, Show, Artist, Recommendation, db
+from readers import to_genres_list
+
+# ----------------------------------------------------------------------------#
+# Recommendations.
+# ----------------------------------------------------------------------------#
+# "Similar artists" and "venues like this". Shows form a sparse artist x venue
+# co-occurrence matrix, and genres form a sparse multi-hot matrix for each
+# side. Similarity is a weighted sum of the cosine similarities of the two.
+# It is computed in batches of rows with SciPy, and the top TOP_K per row are
+# stored in the Recommendation table. The detail pages then read them back
+# with a primary-key range lookup.
+#
+# A new show (a, v) only changes the co-occurrence vectors of artist a and
+# venue v, so refresh_for_show() never loads the whole graph. For artist a
+# it reads a's co-play neighbours (artists that share a venue with a), the
+# play vectors and genres of those neighbours and of a's stored list, and
+# scores a against just them. a gets a new list, and each neighbour's
+# stored list gets a's new score merged in; its other scores did not
+# change. Venue v is handled the same way. A candidate that is neither a
+# co-play neighbour nor already in the stored list is only found by
+# rebuild(), which stays the exact, full computation.
+#
+# Every artist and venue carries recommendations_generation. A refresh reads
+# the generations of the lists it will write before it reads any data, and
+# writes each list only if its generation is unchanged, bumping it in the
+# same UPDATE. A refresh that read older data than one that already wrote
+# therefore loses, and it recomputes those lists from fresh data, up to
+# REFRESH_ATTEMPTS times.
+
+TOP_K = 6
+SHOW_WEIGHT = 0.7
+GENRE_WEIGHT = 0.3
+# dense scores held at once per batch: rows in batch x candidate count
+BATCH_CELLS = 4000000
+SHOW_FETCH_SIZE = 10000
+REFRESH_ATTEMPTS = 3
+
+# model, own Show column, other side's Show column
+KINDS = {
+    'artist': (Artist, Show.artist_id, Show.venue_id),
+    'venue': (Venue, Show.venue_id, Show.artist_id),
+}
+
+
+def _normalize(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ matrix
+
+
+class _Side:
+    # ids and genre vectors for artists or venues, in id order
+
+    def __init__(self, rows, vocabulary):
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.index = {entity_id: i for i, entity_id in enumerate(self.ids.tolist())}
+        row_idx, col_idx = [], []
+        for i, (_, genres) in enumerate(rows):
+            for genre in set(to_genres_list(genres)):
+                row_idx.append(i)
+                col_idx.append(vocabulary.setdefault(genre.lower(), len(vocabulary)))
+        self._genre_cells = (row_idx, col_idx)
+        self.genres = None
+
+    def finish(self, vocabulary_size):
+        row_idx, col_idx = self._genre_cells
+        self.genres = _normalize(sparse.csr_matrix(
+            (np.ones(len(row_idx)), (row_idx, col_idx)), shape=(len(self.ids), vocabulary_size)))
+
+
+def _load():
+    vocabulary = {}
+    artists = _Side(db.session.execute(select(Artist.id, Artist.genres).order_by(Artist.id)).all(), vocabulary)
+    venues = _Side(db.session.execute(select(Venue.id, Venue.genres).order_by(Venue.id)).all(), vocabulary)
+    artists.finish(len(vocabulary))
+    venues.finish(len(vocabulary))
+
+    artist_rows, venue_rows = [], []
+    shows = db.session.execute(select(Show.artist_id, Show.venue_id)
+                               .execution_options(stream_results=True, yield_per=SHOW_FETCH_SIZE))
+    for artist_id, venue_id in shows:
+        if artist_id in artists.index and venue_id in venues.index:
+            artist_rows.append(artists.index[artist_id])
+            venue_rows.append(venues.index[venue_id])
+    # duplicate (artist, venue) pairs are summed into play counts
+    plays = sparse.csr_matrix((np.ones(len(artist_rows)), (artist_rows, venue_rows)),
+                              shape=(len(artists.ids), len(venues.ids)))
+    return artists, venues, plays
+
+
+def _top_k(side, plays, rows):
+    # yields (source_id, [(target_id, score), ...]) for each row index in rows
+    plays = _normalize(plays)
+    count = len(side.ids)
+    k = min(TOP_K, count - 1)
+    step = max(1, BATCH_CELLS // max(count, 1))
+    for start in range(0, len(rows), step):
+        batch = np.asarray(rows[start:start + step])
+        scores = (SHOW_WEIGHT * (plays[batch] @ plays.T) + GENRE_WEIGHT * (side.genres[batch] @ side.genres.T))
+        scores = scores.toarray()
+        scores[np.arange(len(batch)), batch] = 0.0
+        if k <= 0:
+            for row in batch:
+                yield int(side.ids[row]), []
+            continue
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for i, row in enumerate(batch):
+            candidates = top[i][np.argsort(-scores[i, top[i]], kind='stable')]
+            yield int(side.ids[row]), [(int(side.ids[c]), float(scores[i, c]))
+                                       for c in candidates if scores[i, c] > 0]
+
+
+def _store(kind, results):
+    # replace the stored list of every source in results, one short transaction per batch
+    batch = []
+    for item in results:
+        batch.append(item)
+        if len(batch) >= 1000:
+            _store_batch(kind, batch)
+            batch = []
+    if batch:
+        _store_batch(kind, batch)
+
+
+def _replace(kind, batch):
+    db.session.execute(delete(Recommendation.__table__).where(and_(
+        Recommendation.kind == kind, Recommendation.source_id.in_([source_id for source_id, _ in batch]))))
+    rows = [{'kind': kind, 'source_id': source_id, 'rank': rank, 'target_id': target_id, 'score': score}
+            for source_id, targets in batch
+            for rank, (target_id, score) in enumerate(targets)]
+    if rows:
+        db.session.execute(Recommendation.__table__.insert(), rows)
+
+
+def _store_batch(kind, batch):
+    # a full rebuild wins over any refresh that read data before it
+    model = KINDS[kind][0]
+    db.session.execute(update(model.__table__)
+                       .where(model.id.in_(sorted(source_id for source_id, _ in batch)))
+                       .values(recommendations_generation=model.recommendations_generation + 1))
+    _replace(kind, batch)
+    db.session.commit()
+
+
+def rebuild():
+    artists, venues, plays = _load()
+    _store('artist', _top_k(artists, plays, np.arange(len(artists.ids))))
+    _store('venue', _top_k(venues, plays.T.tocsr(), np.arange(len(venues.ids))))
+    for kind, model in (('artist', Artist), ('venue', Venue)):
+        db.session.execute(delete(Recommendation.__table__).where(and_(
+            Recommendation.kind == kind, Recommendation.source_id.notin_(select(model.id)))))
+    db.session.commit()
+    return len(artists.ids), len(venues.ids)
+
+
+# ----------------------------------------------------------------------------#
+# Incremental refresh.
+# ----------------------------------------------------------------------------#
+
+def _neighbours(kind, source_id):
+    # artists that share a venue with source_id, or venues that share an artist
+    _, own, other = KINDS[kind]
+    shared = select(other).where(own == source_id)
+    return set(db.session.execute(select(own).distinct().where(other.in_(shared))).scalars()) - {source_id}
+
+
+def _generations(kind, ids):
+    model = KINDS[kind][0]
+    return dict(db.session.execute(
+        select(model.id, model.recommendations_generation).where(model.id.in_(ids))).all())
+
+
+def _stored(kind, source_ids):
+    # {source_id: [(target_id, score), ...]} as currently stored, best first
+    lists = {source_id: [] for source_id in source_ids}
+    rows = db.session.execute(
+        select(Recommendation.source_id, Recommendation.target_id, Recommendation.score)
+        .where(Recommendation.kind == kind, Recommendation.source_id.in_(source_ids))
+        .order_by(Recommendation.source_id, Recommendation.rank))
+    for source_id, target_id, score in rows:
+        lists[source_id].append((target_id, score))
+    return lists
+
+
+def _scores(kind, source_id, candidate_ids):
+    # {candidate_id: score} against source_id, from the vectors of these rows only
+    model, own, other = KINDS[kind]
+    ids = sorted(set(candidate_ids) | {source_id})
+    vocabulary = {}
+    side = _Side(db.session.execute(select(model.id, model.genres).where(model.id.in_(ids))
+                                    .order_by(model.id)).all(), vocabulary)
+    side.finish(max(len(vocabulary), 1))
+    if source_id not in side.index:
+        return None
+    columns = {}
+    row_idx, col_idx, counts = [], [], []
+    plays = db.session.execute(select(own, other, func.count()).where(own.in_(ids)).group_by(own, other))
+    for own_id, other_id, count in plays:
+        if own_id in side.index:
+            row_idx.append(side.index[own_id])
+            col_idx.append(columns.setdefault(other_id, len(columns)))
+            counts.append(count)
+    plays = _normalize(sparse.csr_matrix((np.asarray(counts, dtype=float), (row_idx, col_idx)),
+                                         shape=(len(side.ids), max(len(columns), 1))))
+    i = side.index[source_id]
+    scores = SHOW_WEIGHT * (plays[i] @ plays.T) + GENRE_WEIGHT * (side.genres[i] @ side.genres.T)
+    scores = scores.toarray().ravel()
+    return {int(entity_id): float(scores[j]) for j, entity_id in enumerate(side.ids) if j != i}
+
+
+def _best(scored):
+    # [(target_id, score), ...] -> the top TOP_K with a positive score, best first
+    return sorted((item for item in scored if item[1] > 0), key=lambda item: (-item[1], item[0]))[:TOP_K]
+
+
+def _write(kind, lists, generations):
+    # Store each list whose generation is unchanged, bumping it. Returns the
+    # source ids that lost to a newer write.
+    model = KINDS[kind][0]
+    lost = []
+    for source_id in sorted(lists):
+        won = db.session.execute(
+            update(model.__table__)
+            .where(model.id == source_id, model.recommendations_generation == generations[source_id])
+            .values(recommendations_generation=model.recommendations_generation + 1)
+        ).rowcount
+        if won:
+            _replace(kind, [(source_id, lists[source_id])])
+        else:
+            lost.append(source_id)
+    db.session.commit()
+    return lost
+
+
+def _refresh(kind, source_id, only=None):
+    # Recompute source_id's list and its place in its neighbours' lists,
+    # writing only the sources in `only` when given. Returns the lost ones.
+    neighbours = _neighbours(kind, source_id)
+    sources = {source_id} | neighbours
+    if only is not None:
+        sources &= set(only)
+    generations = _generations(kind, sources)
+    # a deleted source has no generation and nothing to write
+    sources = set(generations)
+    stored = _stored(kind, {source_id} | neighbours)
+    scores = _scores(kind, source_id, neighbours | {target_id for target_id, _ in stored[source_id]})
+    if scores is None:
+        db.session.rollback()
+        return []
+    lists = {}
+    if source_id in sources:
+        lists[source_id] = _best(scores.items())
+    for neighbour in neighbours & sources:
+        merged = [item for item in stored[neighbour] if item[0] != source_id]
+        lists[neighbour] = _best(merged + [(source_id, scores.get(neighbour, 0.0))])
+    return _write(kind, lists, generations)
+
+
+def refresh_for_show(artist_id, venue_id):
+    # venues before artists, the order the show insert locks them in
+    for kind, source_id in (('venue', venue_id), ('artist', artist_id)):
+        lost = None
+        for _ in range(REFRESH_ATTEMPTS):
+            lost = _refresh(kind, source_id, lost)
+            if not lost:
+                break
+
+
+def forget(kind, entity_id):
+    # drop the stored list of a deleted artist or venue; lists that point at
+    # it are filtered out on read by the join and fixed by the next refresh
+    db.session.execute(delete(Recommendation.__table__).where(and_(
+        Recommendation.kind == kind, Recommendation.source_id == entity_id)))
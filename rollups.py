@@ -0,0 +1,161 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import calendar
+from collections import Counter, defaultdict
+from datetime import date
+
+import numpy as np
+from sqlalchemy import and_, delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from models import Venue, Show, Artist, VenueDailyRollup, ArtistDailyRollup, VenueArtistRollup, db
+
+# ----------------------------------------------------------------------------#
+# Show rollups.
+# ----------------------------------------------------------------------------#
+# Per-venue and per-artist daily show counts, plus venue x artist totals.
+# record_show() and forget_rows() apply inserts and deletes to the rollups
+# inside the caller's transaction. The analytics pages read only these
+# tables and never scan Show. rebuild() recomputes everything from Show with
+# numpy, for backfills and repairs.
+#
+# A rollup must never make a valid show write fail. Two first shows for the
+# same (venue, day) can commit at once, so increments are one atomic upsert
+# (INSERT ... ON CONFLICT DO UPDATE) on Postgres and SQLite, and elsewhere an
+# INSERT in a savepoint that falls back to the UPDATE on a key conflict.
+
+REBUILD_FETCH_SIZE = 50000
+TOP_LIMIT = 10
+EPOCH = date(1970, 1, 1)
+
+
+UPSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def _bump(table, keys, delta):
+    where = and_(*[table.c[name] == value for name, value in keys.items()])
+    increment = update(table).where(where).values(show_count=table.c.show_count + delta)
+    if delta < 0:
+        db.session.execute(increment)
+        db.session.execute(delete(table).where(and_(where, table.c.show_count <= 0)))
+        return
+    upsert = UPSERTS.get(db.engine.dialect.name)
+    if upsert is not None:
+        db.session.execute(upsert(table).values(show_count=delta, **keys).on_conflict_do_update(
+            index_elements=list(keys), set_={'show_count': table.c.show_count + delta}))
+        return
+    if db.session.execute(increment).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(show_count=delta, **keys))
+    except IntegrityError:
+        # another transaction inserted the row after our UPDATE
+        db.session.execute(increment)
+
+
+def record_show(venue_id, artist_id, start_time, delta=1):
+    # delta=1 when a show is added, -1 when one is removed
+    day = start_time.date()
+    _bump(VenueDailyRollup.__table__, {'venue_id': venue_id, 'day': day}, delta)
+    _bump(ArtistDailyRollup.__table__, {'artist_id': artist_id, 'day': day}, delta)
+    _bump(VenueArtistRollup.__table__, {'venue_id': venue_id, 'artist_id': artist_id}, delta)
+
+
+def forget_rows(rows):
+    # Take already-read shows, as (venue_id, artist_id, start_time), out of
+    # the rollups, with one statement per affected rollup row.
+    venue_days, artist_days, pairs = Counter(), Counter(), Counter()
+    for venue_id, artist_id, start_time in rows:
+        venue_days[(venue_id, start_time.date())] += 1
+        artist_days[(artist_id, start_time.date())] += 1
+        pairs[(venue_id, artist_id)] += 1
+    for (venue_id, day), count in venue_days.items():
+        _bump(VenueDailyRollup.__table__, {'venue_id': venue_id, 'day': day}, -count)
+    for (artist_id, day), count in artist_days.items():
+        _bump(ArtistDailyRollup.__table__, {'artist_id': artist_id, 'day': day}, -count)
+    for (venue_id, artist_id), count in pairs.items():
+        _bump(VenueArtistRollup.__table__, {'venue_id': venue_id, 'artist_id': artist_id}, -count)
+
+
+# ----------------------------------------------------------------------------#
+# Bulk rebuild.
+# ----------------------------------------------------------------------------#
+
+def _count_pairs(counts, left, right):
+    pairs, totals = np.unique(np.stack([left, right], axis=1), axis=0, return_counts=True)
+    for (a, b), total in zip(pairs.tolist(), totals.tolist()):
+        counts[(a, b)] += total
+
+
+def rebuild():
+    venue_days, artist_days, venue_artists = Counter(), Counter(), Counter()
+    shows = db.session.execute(select(Show.venue_id, Show.artist_id, Show.start_time)
+                               .execution_options(stream_results=True, yield_per=REBUILD_FETCH_SIZE))
+    for chunk in shows.partitions(REBUILD_FETCH_SIZE):
+        venue_ids = np.fromiter((row[0] for row in chunk), dtype=np.int64, count=len(chunk))
+        artist_ids = np.fromiter((row[1] for row in chunk), dtype=np.int64, count=len(chunk))
+        days = np.array([row[2] for row in chunk], dtype='datetime64[D]').astype(np.int64)
+        _count_pairs(venue_days, venue_ids, days)
+        _count_pairs(artist_days, artist_ids, days)
+        _count_pairs(venue_artists, venue_ids, artist_ids)
+
+    def to_date(days):
+        return date.fromordinal(EPOCH.toordinal() + days)
+
+    for table in (VenueDailyRollup, ArtistDailyRollup, VenueArtistRollup):
+        db.session.execute(delete(table.__table__))
+    if venue_days:
+        db.session.execute(VenueDailyRollup.__table__.insert(), [
+            {'venue_id': v, 'day': to_date(d), 'show_count': n} for (v, d), n in venue_days.items()])
+    if artist_days:
+        db.session.execute(ArtistDailyRollup.__table__.insert(), [
+            {'artist_id': a, 'day': to_date(d), 'show_count': n} for (a, d), n in artist_days.items()])
+    if venue_artists:
+        db.session.execute(VenueArtistRollup.__table__.insert(), [
+            {'venue_id': v, 'artist_id': a, 'show_count': n} for (v, a), n in venue_artists.items()])
+    db.session.commit()
+    return sum(venue_days.values())
+
+
+# ----------------------------------------------------------------------------#
+# Analytics.
+# ----------------------------------------------------------------------------#
+
+def _summarize(daily_rows, top_rows):
+    months = defaultdict(int)
+    weekdays = [0] * 7
+    for day, count in daily_rows:
+        months['%04d-%02d' % (day.year, day.month)] += count
+        weekdays[day.weekday()] += count
+    return {
+        'total_shows': sum(weekdays),
+        'shows_per_month': [{'month': month, 'shows': months[month]} for month in sorted(months)],
+        'busiest_weekdays': sorted(({'weekday': calendar.day_name[i], 'shows': count}
+                                    for i, count in enumerate(weekdays)), key=lambda item: -item['shows']),
+        'top': [{'id': top_id, 'name': name, 'shows': count} for top_id, name, count in top_rows],
+    }
+
+
+def venue_analytics(venue_id):
+    daily = db.session.execute(select(VenueDailyRollup.day, VenueDailyRollup.show_count)
+                               .where(VenueDailyRollup.venue_id == venue_id)).all()
+    top = db.session.execute(select(Artist.id, Artist.name, VenueArtistRollup.show_count)
+                             .join(Artist, VenueArtistRollup.artist_id == Artist.id)
+                             .where(VenueArtistRollup.venue_id == venue_id)
+                             .order_by(VenueArtistRollup.show_count.desc(), Artist.id)
+                             .limit(TOP_LIMIT)).all()
+    return _summarize(daily, top)
+
+
+def artist_analytics(artist_id):
+    daily = db.session.execute(select(ArtistDailyRollup.day, ArtistDailyRollup.show_count)
+                               .where(ArtistDailyRollup.artist_id == artist_id)).all()
+    top = db.session.execute(select(Venue.id, Venue.name, VenueArtistRollup.show_count)
+                             .join(Venue, VenueArtistRollup.venue_id == Venue.id)
+                             .where(VenueArtistRollup.artist_id == artist_id)
+                             .order_by(VenueArtistRollup.show_count.desc(), Venue.id)
+                             .limit(TOP_LIMIT)).all()
+    return _summarize(daily, top)
@@ -0,0 +1,84 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+from sqlalchemy import and_, bindparam, func, select
+
+from cache import TTLCache
+from models import Venue, Show, Artist, db
+
+# ----------------------------------------------------------------------------#
+# Search.
+# ----------------------------------------------------------------------------#
+# Venue and artist name search, one bounded page at a time. Pages are cached
+# per process, keyed on the normalized term, for a short TTL so that popular
+# searches are served from memory. Writes are not propagated here; a new or
+# renamed row shows up once the entry expires.
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_CACHE_TTL = 30
+
+search_cache = TTLCache(maxsize=1024, ttl=SEARCH_CACHE_TTL)
+
+
+def normalize_term(term):
+    return ' '.join((term or '').lower().split())
+
+
+def _search(kind, term, page, count_statement, page_statement):
+    term = normalize_term(term)
+    page = max(page, 1)
+    key = (kind, term, page)
+    results = search_cache.get(key)
+    if results is not None:
+        return results
+    params = {
+        'val': '%' + _escape_like(term) + '%',
+        'limit': SEARCH_PAGE_SIZE,
+        'offset': (page - 1) * SEARCH_PAGE_SIZE,
+    }
+    count = db.session.execute(count_statement, params).scalar()
+    data = [dict(row) for row in db.session.execute(page_statement, params).mappings()]
+    results = {
+        "count": count,
+        "data": data,
+        "page": page,
+        "has_prev": page > 1,
+        "has_next": page * SEARCH_PAGE_SIZE < count,
+    }
+    search_cache.set(key, results)
+    return results
+
+
+def _escape_like(term):
+    # a typed % or _ is a literal character, not a wildcard
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _statements(model, show_column):
+    # ilike() renders ILIKE on Postgres and lower(x) LIKE lower(y) elsewhere
+    matches = model.name.ilike(bindparam('val'), escape='\\')
+    count_statement = select(func.count()).select_from(model).where(matches)
+    page_statement = select(model.id, model.name, func.count(Show.id).label('num_upcoming_shows')) \
+        .outerjoin(Show, and_(model.id == show_column, Show.start_time > func.now())) \
+        .where(matches) \
+        .group_by(model.id) \
+        .order_by(model.name, model.id) \
+        .limit(bindparam('limit')) \
+        .offset(bindparam('offset'))
+    return count_statement, page_statement
+
+
+VENUE_SEARCH = _statements(Venue, Show.venue_id)
+ARTIST_SEARCH = _statements(Artist, Show.artist_id)
+
+
+def search_venues(term, page=1):
+    # search for Hop should return "The Musical Hop".
+    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+    return _search('venues', term, page, *VENUE_SEARCH)
+
+
+def search_artists(term, page=1):
+    # search for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+    # search for "band" should return "The Wild Sax Band".
+    return _search('artists', term, page, *ARTIST_SEARCH)
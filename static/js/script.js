@@ -2,3 +2,34 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Start a background delete and poll its status until it finishes
+window.deleteWithProgress = function deleteWithProgress(button, url, noun) {
+  button.disabled = true;
+  fetch(url, { method: 'DELETE' })
+    .then(function (response) {
+      if (!response.ok) throw new Error(noun + ' could not be deleted.');
+      return response.json();
+    })
+    .then(function poll(status) {
+      if (status.state === 'done') {
+        alert(noun + ' deleted successfully!');
+        window.location.href = '/';
+        return;
+      }
+      if (status.state === 'failed') throw new Error(noun + ' deletion failed: ' + status.error);
+      button.textContent = 'Deleting… ' + status.shows_deleted + (status.shows_total ? ' / ' + status.shows_total : '') + ' shows';
+      return new Promise(function (resolve) { setTimeout(resolve, 1000); })
+        .then(function () { return fetch(status.status_url || url + '/deletion'); })
+        .then(function (response) {
+          if (!response.ok) throw new Error(noun + ' deletion status is unavailable.');
+          return response.json();
+        })
+        .then(function (next) { next.status_url = status.status_url; return poll(next); });
+    })
+    .catch(function (err) {
+      alert(err.message);
+      button.disabled = false;
+      button.textContent = 'Delete';
+    });
+};
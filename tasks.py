@@ -0,0 +1,136 @@
+# ----------------------------------------------------------------------------#
+# Imports
+# ----------------------------------------------------------------------------#
+import atexit
+import queue
+import threading
+import time
+
+import metrics
+from models import db
+
+# ----------------------------------------------------------------------------#
+# Background tasks.
+# ----------------------------------------------------------------------------#
+# Follow-up work that does not need to finish before the response, such as
+# recomputing recommendations after a new show. Handlers call enqueue() after
+# their commit, and a small pool of worker threads runs the tasks from a
+# bounded queue inside an app context. A task that raises is retried with
+# exponential backoff, up to TASK_MAX_RETRIES times. On shutdown the workers
+# finish what is already queued, for up to TASK_DRAIN_TIMEOUT seconds; what
+# is still queued at the deadline is abandoned.
+#
+# Tasks only run in this process and are lost if it is killed, so they must
+# be safe to drop. Anything derived has a rebuild command to repair it.
+
+_STOP = object()
+_queue = None
+_workers = []
+_app = None
+_max_retries = 0
+_retry_delay = 0.0
+_running = 0
+_running_lock = threading.Lock()
+_attempt = threading.local()
+# set once a drain's deadline has passed; workers stop taking tasks
+_abandoned = threading.Event()
+
+
+def _run(func, args, kwargs):
+    with _app.app_context():
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+
+def _work(tasks):
+    global _running
+    while True:
+        item = tasks.get()
+        if item is _STOP or _abandoned.is_set():
+            return
+        func, args, kwargs = item
+        name = getattr(func, '__qualname__', repr(func))
+        with _running_lock:
+            _running += 1
+        try:
+            for attempt in range(_max_retries + 1):
+                _attempt.final = attempt == _max_retries
+                try:
+                    _run(func, args, kwargs)
+                    metrics.inc('fyyur_tasks_total', labels=(('task', name), ('outcome', 'done')))
+                    break
+                except Exception:
+                    if attempt == _max_retries:
+                        _app.logger.exception('task %s failed after %d attempts', name, attempt + 1)
+                        metrics.inc('fyyur_tasks_total', labels=(('task', name), ('outcome', 'failed')))
+                    else:
+                        metrics.inc('fyyur_tasks_total', labels=(('task', name), ('outcome', 'retried')))
+                        time.sleep(_retry_delay * 2 ** attempt)
+        finally:
+            _attempt.final = True
+            with _running_lock:
+                _running -= 1
+
+
+def final_attempt():
+    # False while a failing task will still be retried, True otherwise and
+    # outside the workers, where a task runs inline exactly once
+    return getattr(_attempt, 'final', True)
+
+
+def enqueue(func, *args, **kwargs):
+    # Run func(*args, **kwargs) on a worker. Before init_app, after drain, or
+    # when the queue is full, it runs inline instead, so a backlog slows
+    # writers down rather than dropping work.
+    if _queue is not None:
+        try:
+            _queue.put_nowait((func, args, kwargs))
+            return
+        except queue.Full:
+            metrics.inc('fyyur_tasks_inline_total')
+    func(*args, **kwargs)
+
+
+def drain(timeout):
+    # stop accepting work and wait for the workers to finish the queue
+    global _queue
+    if _queue is None:
+        return
+    deadline = time.monotonic() + timeout
+    pending, _queue = _queue, None
+    for _ in _workers:
+        # a full queue must not hold shutdown past the deadline
+        try:
+            pending.put(_STOP, timeout=max(0, deadline - time.monotonic()))
+        except queue.Full:
+            break
+    for worker in _workers:
+        worker.join(max(0, deadline - time.monotonic()))
+    _abandoned.set()
+    _workers.clear()
+
+
+def _collect_queue():
+    depth = _queue.qsize() if _queue is not None else 0
+    yield ('fyyur_tasks_queued', 'gauge', 'Background tasks waiting for a worker.', [((), depth)])
+    yield ('fyyur_tasks_running', 'gauge', 'Background tasks being run.', [((), _running)])
+
+
+def init_app(app):
+    global _app, _queue, _max_retries, _retry_delay
+    _app = app
+    _max_retries = app.config['TASK_MAX_RETRIES']
+    _retry_delay = app.config['TASK_RETRY_DELAY']
+    _abandoned.clear()
+    _queue = queue.Queue(app.config['TASK_QUEUE_SIZE'])
+    for i in range(app.config['TASK_WORKERS']):
+        worker = threading.Thread(target=_work, args=(_queue,), name='fyyur-task-%d' % i, daemon=True)
+        worker.start()
+        _workers.append(worker)
+    metrics.register_collector(_collect_queue)
+    atexit.register(drain, app.config['TASK_DRAIN_TIMEOUT'])